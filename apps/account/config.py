@@ -3,4 +3,9 @@ from django.apps import AppConfig
 
 class AccountConfig(AppConfig):
     name = 'apps.account'
-    label = 'apps.account'
\ No newline at end of file
+    label = 'apps.account'
+
+    def ready(self):
+
+        # import signal handlers
+        from . import receivers
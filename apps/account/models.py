@@ -1,4 +1,5 @@
 from django.contrib.auth.models import User
+from apps.core import roles
 
 
 SITE_ADMIN_GROUP_NAME = 'site admin'
@@ -7,5 +8,12 @@ SITE_ADMIN_GROUP_NAME = 'site admin'
 # Add the is_admin property to User instances
 def _is_admin(self):
     "Whether to treat the user as a site admin."
-    return self.is_superuser or self.groups.filter(name=SITE_ADMIN_GROUP_NAME).exists()
+    return roles.get_roles(self)['admin']
 User.is_admin = property(_is_admin)
+
+
+@roles.register('admin', shared=False)
+def get_is_admin(user):
+    "Returns whether the user is a superuser or in the site admin group."
+    return user.is_superuser or user.groups.filter(
+                                        name=SITE_ADMIN_GROUP_NAME).exists()
@@ -0,0 +1,27 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.contrib.auth.models import User
+from apps.core.roles import invalidate_roles
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_roles_on_user_changed(sender, instance, **kwargs):
+    "Makes sure the user's cached roles don't go stale, e.g. is_superuser."
+    invalidate_roles([instance.pk])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_roles_on_groups_changed(sender, instance, action, reverse,
+                                       pk_set, **kwargs):
+    "Clears the cached roles of users added to or removed from groups."
+    if not reverse:
+        # The user's groups were changed
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_roles([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        # Users were added to or removed from the group
+        invalidate_roles(pk_set)
+    elif action == 'pre_clear':
+        # The group is being emptied; pk_set isn't supplied, so look up
+        # its users while we still can
+        invalidate_roles(instance.user_set.values_list('pk', flat=True))
@@ -2,4 +2,6 @@
 It is split into subpackages that mirror the app structure of the wider
 Django project, though at present the subpackages within the api are not
 encapsulated very well.
-"""
\ No newline at end of file
+"""
+
+default_app_config = 'apps.api.config.ApiConfig'
@@ -6,12 +6,13 @@ from rest_framework.decorators import detail_route
 from ..freelancer.permissions import FreelancerOnlyPermission
 from .serializers import (BookingSerializer, InvitationSerializer,
                           ApplicationSerializer)
-from apps.api.views import DateSliceMixin
+from apps.api.views import DateSliceMixin, ConditionalListMixin
 from apps.booking.models import (Booking, Invitation,
                             JobAlreadyBookedByFreelancer, JobFullyBooked)
 
 
-class BookingForFreelancerViewSet(DateSliceMixin, viewsets.ReadOnlyModelViewSet):
+class BookingForFreelancerViewSet(ConditionalListMixin, DateSliceMixin,
+                                  viewsets.ReadOnlyModelViewSet):
     """All bookings for the currently logged in freelancer.
     
     Note: you must be logged in as a freelancer.
@@ -28,9 +29,18 @@ class BookingForFreelancerViewSet(DateSliceMixin, viewsets.ReadOnlyModelViewSet)
     - `reference_number` Public reference number for the booking.  Read only.
     - `job_request` API URL for the job request the booking is for.  
     - `date_created` Date and time of when the booking was created.
+
+    ## Conditional requests
+
+    Responses include `ETag` and `Last-Modified` headers.  Pass them back as
+    `If-None-Match` or `If-Modified-Since` to get an empty 304 response
+    if nothing has changed.
     """
     serializer_class = BookingSerializer
 
+    # Bookings move from future to past as time passes
+    conditional_max_age = 300
+
     permission_classes = (FreelancerOnlyPermission,)
 
     def get_queryset(self):
@@ -39,7 +49,8 @@ class BookingForFreelancerViewSet(DateSliceMixin, viewsets.ReadOnlyModelViewSet)
         return queryset
 
 
-class InvitationForFreelancerViewSet(viewsets.ReadOnlyModelViewSet):
+class InvitationForFreelancerViewSet(ConditionalListMixin,
+                                     viewsets.ReadOnlyModelViewSet):
     """All invitations that can be applied to by the currently
     logged in freelancer.
     
@@ -64,9 +75,18 @@ class InvitationForFreelancerViewSet(viewsets.ReadOnlyModelViewSet):
     Invitations are not guaranteed to stay valid - for example, if a job is
     becomes fully booked.  If the invitation is no longer valid, the response
     will be a 404.
+
+    ## Conditional requests
+
+    Responses include `ETag` and `Last-Modified` headers.  Pass them back as
+    `If-None-Match` or `If-Modified-Since` to get an empty 304 response
+    if nothing has changed.
     """
     serializer_class = InvitationSerializer
 
+    # Invitations stop being valid once the job request is in the past
+    conditional_max_age = 300
+
     permission_classes = (FreelancerOnlyPermission,)
 
     def get_queryset(self):
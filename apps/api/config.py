@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class ApiConfig(AppConfig):
+
+    name = 'apps.api'
+    verbose_name = 'API'
+
+    def ready(self):
+
+        # import signal handlers
+        from . import receivers
@@ -9,6 +9,7 @@ from ..location.serializers import PostcodeField
 from apps.freelancer.utils import service_for_freelancer
 from apps.freelancer.models import Freelancer, FREELANCER_MIN_WAGE
 from apps.core.validators import mobile_validator
+from apps.feedback.models import BookingFeedback
 
 
 class ThumbnailField(serializers.SerializerMethodField):
@@ -49,14 +50,42 @@ class SpecificFreelancerIdentityField(serializers.HyperlinkedIdentityField):
             return self.reverse(view_name, request=request, format=format)
 
 
+# How many reviews to include for each freelancer, unless the request
+# asks for a different number with the 'reviews' query parameter
+DEFAULT_REVIEW_LIMIT = 20
+MAX_REVIEW_LIMIT = 50
+
+
+def get_review_limit(context):
+    "Returns the number of reviews to include, for the serializer context."
+    request = context.get('request')
+    try:
+        limit = int(request.query_params['reviews'])
+    except (AttributeError, KeyError, ValueError):
+        return DEFAULT_REVIEW_LIMIT
+    return min(max(limit, 0), MAX_REVIEW_LIMIT)
+
+
+class FreelancerListSerializer(serializers.ListSerializer):
+    """Serializer for lists of freelancers, which loads the reviews for
+    all of them in a single query.
+    """
+    def to_representation(self, data):
+        freelancers = list(data.all() if hasattr(data, 'all') else data)
+        BookingFeedback.objects.prefetch_reviews(freelancers,
+                                                 get_review_limit(self.context))
+        return super(FreelancerListSerializer, self).to_representation(
+                                                                freelancers)
+
+
 class FreelancerForClientSerializer(serializers.ModelSerializer):
     """Serializer that exposes information on the freelancer
     appropriate for client use.
     """
     reviews = serializers.SerializerMethodField()
     def get_reviews(self, obj):
-      for r in obj.reviews():
-        yield {'comment': r.comment, "score":r.score}
+        return [{'comment': review.comment, 'score': review.score}
+                for review in obj.reviews(get_review_limit(self.context))]
 
     service_key = serializers.SerializerMethodField()
     def get_service_key(self, obj):
@@ -84,6 +113,7 @@ class FreelancerForClientSerializer(serializers.ModelSerializer):
                   'full_name', 'first_name', 'last_name', 'mobile',
                   'years_experience', 'minimum_pay_per_hour',
                   'average_score', 'reviews')
+        list_serializer_class = FreelancerListSerializer
 
 
 class OwnFreelancerSerializer(FreelancerForClientSerializer):
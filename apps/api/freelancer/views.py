@@ -52,6 +52,13 @@ class FreelancerForClientViewSet(viewsets.ReadOnlyModelViewSet):
     - `average_score` The average rating score, out of 5,
                     that the freelancer has received, or null if there is no feedback.
                     Decimal.  Read only.
+    - `reviews` The most recent reviews clients have left for the freelancer,
+       newest first, each with a `comment` and a `score`.
+
+    ## Query parameters
+
+    - `reviews` Optional.  How many reviews to include for each freelancer,
+       up to 50.  Defaults to 20.
     """
     serializer_class = FreelancerForClientSerializer
 
@@ -62,7 +69,8 @@ class FreelancerForClientViewSet(viewsets.ReadOnlyModelViewSet):
         # Show only published freelancers who are booked in to the client's jobs
         client_bookings = Booking.objects.for_client(self.request.user.client)
         return self.model_class.published_objects.filter(
-                                    bookings__in=client_bookings).distinct()
+                                    bookings__in=client_bookings).distinct(
+                                    ).prefetch_related('rating_summary')
 
 
 class OwnFreelancerViewSet(RetrieveAndUpdateViewset):
@@ -6,10 +6,11 @@ from ..booking.serializers import BookingsJobRequestForClientSerializer
 from .serializers import (JobRequestForFreelancerSerializer,
                           JobRequestForClientSerializer)
 from apps.job.models import JobRequest
-from apps.api.views import DateSliceMixin
+from apps.api.views import DateSliceMixin, ConditionalListMixin
 
 
-class JobRequestForClientViewSet(DateSliceMixin, viewsets.ReadOnlyModelViewSet):
+class JobRequestForClientViewSet(ConditionalListMixin, DateSliceMixin,
+                                 viewsets.ReadOnlyModelViewSet):
     """All job requests created by the logged in client.
     
     This endpoint can be used to list job requests.  To create job
@@ -71,11 +72,20 @@ class JobRequestForClientViewSet(DateSliceMixin, viewsets.ReadOnlyModelViewSet):
         - `reference_number` Public reference number for the booking.
         - `freelancer` URL of freelancer endpoint.
         - `date_created` The date and time the booking was created.
+
+    ## Conditional requests
+
+    Responses include `ETag` and `Last-Modified` headers.  Pass them back as
+    `If-None-Match` or `If-Modified-Since` to get an empty 304 response
+    if nothing has changed.
     """
     serializer_class = BookingsJobRequestForClientSerializer
     permission_classes = (ClientOnlyPermission,)
     model_class = JobRequest
 
+    # Job requests move from future to past as time passes
+    conditional_max_age = 300
+
     def get_queryset(self):
         queryset = self.model_class.objects.for_client(
                                                 self.request.user.client)
@@ -0,0 +1,45 @@
+from django.db import models, transaction, IntegrityError
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+class ChangeVersionQuerySet(models.QuerySet):
+    "Custom queryset for ChangeVersions."
+
+    def get_for_user(self, user):
+        "Returns the ChangeVersion for the user, creating it if necessary."
+        try:
+            return self.get(user=user)
+        except ChangeVersion.DoesNotExist:
+            try:
+                with transaction.atomic():
+                    return self.create(user=user)
+            except IntegrityError:
+                # It was created by another request in the meantime
+                return self.get(user=user)
+
+    def bump(self, user_ids):
+        """Records that the data for the users with the supplied ids
+        has changed, in a single query.  Users without a ChangeVersion are
+        left alone, as they can't have cached anything yet.
+        """
+        self.filter(user_id__in=set(user_ids)).update(
+                                version=models.F('version') + 1,
+                                datetime_changed=timezone.now())
+
+
+class ChangeVersion(models.Model):
+    """A version number for the data the API shows to a user, which is
+    bumped whenever any of it changes.  The polled API endpoints use it to
+    respond to conditional requests (see apps.api.views.ConditionalListMixin).
+    The version is bumped by the receivers in apps.api.receivers.
+    """
+    user = models.OneToOneField(User, primary_key=True,
+                                related_name='api_change_version')
+    version = models.PositiveIntegerField(default=0)
+    datetime_changed = models.DateTimeField(default=timezone.now)
+
+    objects = ChangeVersionQuerySet.as_manager()
+
+    def __unicode__(self):
+        return 'Version %d for %s' % (self.version, self.user)
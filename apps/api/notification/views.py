@@ -1,15 +1,15 @@
 from rest_framework import viewsets
 from rest_framework import permissions
 from rest_framework import status
-from rest_framework.decorators import detail_route
+from rest_framework.decorators import detail_route, list_route
 from rest_framework.response import Response
-from apps.notification.models import Notification
-from apps.api.views import ViewAndDeleteViewset
+from apps.notification.models import Notification, UnreadNotificationCount
+from apps.api.views import ViewAndDeleteViewset, ConditionalListMixin
+from apps.api.pagination import DateTimeCursorPagination
 from .serializers import NotificationSerializer
-import datetime
 
 
-class NotificationsForUserViewSet(ViewAndDeleteViewset):
+class NotificationsForUserViewSet(ConditionalListMixin, ViewAndDeleteViewset):
     """All notifications for the currently logged in user.  Read only.
     
     ## Fields
@@ -26,16 +26,37 @@ class NotificationsForUserViewSet(ViewAndDeleteViewset):
        Together, the object id and content type form a unique reference to
        the related object. Integer.
     - `content_type` The type of the related object.  String.  
+
+    ## Pagination
+
+    Pass `page_size` (up to 100) to get the notifications a page at a time,
+    newest first.  The response then has the notifications in `results`,
+    and the url of the next page in `next` (null on the last page).
+    Without `page_size`, all the notifications are returned, as a list.
+
+    ## Unread count
+
+    The number of unread notifications is at `notifications/unread_count/`,
+    as `{"unread_count": 3}`.  This is cheaper to poll than the list.
+
+    ## Conditional requests
+
+    Responses include `ETag` and `Last-Modified` headers.  Pass them back as
+    `If-None-Match` or `If-Modified-Since` to get an empty 304 response
+    if nothing has changed.
     
     """
     serializer_class = NotificationSerializer
 
     permission_classes = (permissions.IsAuthenticated,)
 
+    pagination_class = DateTimeCursorPagination
+
     lookup_field = 'pk'
 
     def get_queryset(self):
-        return Notification.objects.for_user(self.request.user)
+        return Notification.objects.for_user(self.request.user
+                                    ).select_related('content_type')
 
     def destroy(self, request, pk=None):
         notification = self.get_object()
@@ -44,6 +65,10 @@ class NotificationsForUserViewSet(ViewAndDeleteViewset):
         # nothing should be deleted ever, to have a record of all
         # notifications sent out to freelancers so they can't claim
         # that they didn't get something later on
-        notification.datetime_deleted = datetime.datetime.now()
-        notification.save()
+        notification.mark_deleted()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @list_route()
+    def unread_count(self, request):
+        return Response({'unread_count':
+                UnreadNotificationCount.objects.get_for_user(request.user)})
@@ -0,0 +1,87 @@
+import base64
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.compat import OrderedDict
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class DateTimeCursorPagination(BasePagination):
+    """Cursor pagination for querysets listed newest first.
+
+    The cursor is the (datetime, id) of the last item on the previous page,
+    so fetching a page is a single indexed query, however far back it is,
+    and items created while paging don't shift the pages.
+
+    Pagination is only used if the request passes a page_size or a cursor,
+    so existing clients still get the full list.  The response is in the form:
+
+        {
+            "next": "https://...?cursor=...",  // or null, on the last page
+            "results": [...]
+        }
+    """
+    datetime_field = 'datetime_created'
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    default_page_size = 20
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params and \
+                self.page_size_query_param not in request.query_params:
+            return None
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-%s' % self.datetime_field, '-id')
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            datetime, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(**{'%s__lt' % self.datetime_field: datetime}) |
+                Q(**{self.datetime_field: datetime, 'id__lt': pk}))
+
+        # Fetch one more than we need, to find out if there's a next page
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.default_page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.cursor_query_param,
+                                   self.encode_cursor(self.page[-1]))
+
+    def encode_cursor(self, obj):
+        return base64.urlsafe_b64encode('%s|%d' % (
+                    getattr(obj, self.datetime_field).isoformat(), obj.pk))
+
+    def decode_cursor(self, cursor):
+        "Returns the (datetime, id) from the cursor."
+        try:
+            datetime, pk = base64.urlsafe_b64decode(str(cursor)).split('|')
+            datetime, pk = parse_datetime(datetime), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound('Invalid cursor.')
+        if datetime is None:
+            raise NotFound('Invalid cursor.')
+        return datetime, pk
@@ -0,0 +1,69 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+from apps.booking.models import (Booking, Invitation,
+                                 get_user_ids_for_job_request)
+from apps.booking.signals import invitations_created
+from apps.feedback.models import BookingFeedback
+from apps.freelancer.models import Freelancer
+from apps.job.models import JobRequest
+from apps.notification.models import Notification
+from apps.notification.signals import notifications_changed
+from apps.service import services
+from .models import ChangeVersion
+
+
+@receiver([post_save, post_delete], sender=JobRequest)
+@receiver([post_save, post_delete], sender=Booking)
+@receiver([post_save, post_delete], sender=BookingFeedback)
+def bump_change_versions_on_job_change(sender, instance, **kwargs):
+    """Bumps the change versions of everyone involved in a job request,
+    when it or any of its bookings or feedback change.
+    (As a job request fills up, for example, the other freelancers'
+    invitations stop being valid.)
+    """
+    if isinstance(instance, JobRequest):
+        job_request_id = instance.pk
+    elif isinstance(instance, Booking):
+        job_request_id = instance.jobrequest_id
+    else:
+        job_request_id = instance.booking.jobrequest_id
+    ChangeVersion.objects.bump(get_user_ids_for_job_request(job_request_id))
+
+# Job requests are mostly saved as their service's model, which is the
+# sender, so connect for each of those too
+for service in services.values():
+    post_save.connect(bump_change_versions_on_job_change,
+                      sender=service.job_request_model)
+    post_delete.connect(bump_change_versions_on_job_change,
+                        sender=service.job_request_model)
+
+
+@receiver([post_save, post_delete], sender=Invitation)
+def bump_change_versions_on_invitation_change(sender, instance, **kwargs):
+    """Bumps the change versions of the invited freelancer and the client,
+    when an invitation changes (e.g. the freelancer applies).  The other
+    freelancers' invitations are unaffected, so aren't bumped.
+    """
+    user_ids = list(Freelancer.objects.filter(pk=instance.freelancer_id
+                                ).values_list('user_id', flat=True))
+    user_ids.extend(JobRequest.objects.filter(pk=instance.jobrequest_id
+                                ).values_list('client__user_id', flat=True))
+    ChangeVersion.objects.bump(user_ids)
+
+
+@receiver(invitations_created)
+def bump_change_versions_on_invitations_created(sender, invitations,
+                                                **kwargs):
+    ChangeVersion.objects.bump(invitation.freelancer.user_id
+                               for invitation in invitations)
+
+
+@receiver([post_save, post_delete], sender=Notification)
+def bump_change_version_on_notification_change(sender, instance, **kwargs):
+    ChangeVersion.objects.bump([instance.user_id])
+
+
+@receiver(notifications_changed)
+def bump_change_versions_on_notifications_changed(sender, user_ids,
+                                                  **kwargs):
+    ChangeVersion.objects.bump(user_ids)
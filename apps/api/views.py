@@ -1,5 +1,14 @@
+import calendar
+import hashlib
+import time
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import (http_date, parse_etags,
+                               parse_http_date_safe, quote_etag)
 from rest_framework import mixins
+from rest_framework import status
 from rest_framework import viewsets
+from rest_framework.response import Response
+from .models import ChangeVersion
 
 class ViewAndDeleteViewset(mixins.DestroyModelMixin, viewsets.ReadOnlyModelViewSet):
   """A viewset to view & delete but not modify things"""
@@ -61,3 +70,63 @@ class DateSliceMixin(object):
         elif self.request.GET.get('dateslice') == 'past':
             queryset = queryset.past()
         return queryset
+
+
+class ConditionalListMixin(object):
+    """Mixin for list endpoints that the mobile apps poll, which answers
+    conditional requests (If-None-Match or If-Modified-Since) with an
+    empty 304 Not Modified response if nothing has changed for the user.
+
+    Whether anything has changed is determined by the user's ChangeVersion
+    (see apps.api.models), so this costs a single lookup by primary key,
+    rather than running the queryset and serializer.  Any model whose
+    changes affect the list must bump the version in apps.api.receivers.
+
+    If the list also changes with the passage of time (for example, with
+    a future dateslice), set conditional_max_age to the number of seconds
+    a response may be reused for.
+    """
+    conditional_max_age = None
+
+    def list(self, request, *args, **kwargs):
+        if not request.user.is_authenticated():
+            return super(ConditionalListMixin, self).list(request,
+                                                          *args, **kwargs)
+
+        change_version = ChangeVersion.objects.get_for_user(request.user)
+        last_modified = calendar.timegm(
+                            change_version.datetime_changed.utctimetuple())
+        period = 0
+        if self.conditional_max_age:
+            period = int(time.time() // self.conditional_max_age)
+            last_modified = max(last_modified,
+                                period * self.conditional_max_age)
+        etag = hashlib.md5('%d:%d:%d:%s' % (request.user.pk,
+                                            change_version.version, period,
+                                            request.get_full_path())
+                           ).hexdigest()
+
+        if self.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = super(ConditionalListMixin, self).list(request,
+                                                              *args, **kwargs)
+        response['ETag'] = quote_etag(etag)
+        response['Last-Modified'] = http_date(last_modified)
+        # The response depends on who is logged in, and must be revalidated
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def is_not_modified(self, request, etag, last_modified):
+        """Returns whether the client's copy, as described by the request's
+        conditional headers, is up to date.  The ETag takes precedence,
+        as Last-Modified is only precise to the second.
+        """
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            return etag in parse_etags(if_none_match)
+        if_modified_since = parse_http_date_safe(
+                            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return if_modified_since is not None and \
+                                            last_modified <= if_modified_since
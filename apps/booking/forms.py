@@ -95,7 +95,10 @@ class JobMatchingForm(CrispyFormMixin, PostcodeFormMixin, forms.Form):
                                 required=False,
                                 choices=JobRequest.YEARS_EXPERIENCE_CHOICES)
 
-    # respect_travel_distance = forms.BooleanField(required=False)
+    respect_travel_distance = forms.BooleanField(required=False,
+                initial=True,
+                help_text="Only include freelancers who are prepared "
+                    "to travel to the postcode.")
 
     def __init__(self, *args, **kwargs):
         # Set the job request
@@ -116,7 +119,10 @@ class JobMatchingForm(CrispyFormMixin, PostcodeFormMixin, forms.Form):
         "Sets the initial data based on the job request."
         matcher = self.job_matcher(self.job_request)
         for name, value in matcher.search_terms.items():
-            self.fields[name].initial = value
+            # Not all search terms are form fields (e.g. the postcode
+            # is populated from raw_postcode)
+            if name in self.fields:
+                self.fields[name].initial = value
 
     def clean(self):
         super(JobMatchingForm, self).clean()
@@ -0,0 +1,197 @@
+"""An optional, in-process index of published freelancers, which allows
+JobMatcher to answer searches from memory rather than running a geo query
+across the polymorphic freelancer tables.
+
+It is switched on with the JOB_MATCHING_INDEX_ACTIVE setting.  Each process
+builds its own index the first time it's needed.  The index is thrown away
+whenever a Freelancer or Availability (or another of the index's
+source_models) is saved in the same process, and is rebuilt after
+JOB_MATCHING_INDEX_MAX_AGE seconds in any case, so changes made by other
+processes are picked up.
+
+Usage:
+
+    index = get_candidate_index(CandidateIndex, Driver)
+    freelancer_ids = index.search(search_terms)
+"""
+import math
+import threading
+import time
+from array import array
+from django.conf import settings
+from apps.freelancer.models import Freelancer, client_to_freelancer_rate
+from apps.location.models import Postcode
+from .models import Availability
+
+
+EARTH_RADIUS_MILES = 3958.8
+
+# The indexes that have been created in this process, keyed by
+# (index class, freelancer model)
+_candidate_indexes = {}
+
+
+def get_candidate_index(index_class, freelancer_model):
+    """Returns the candidate index for the supplied freelancer model,
+    or None if the index isn't active.
+    """
+    if not getattr(settings, 'JOB_MATCHING_INDEX_ACTIVE', False):
+        return None
+    key = (index_class, freelancer_model)
+    if key not in _candidate_indexes:
+        _candidate_indexes[key] = index_class(freelancer_model)
+    return _candidate_indexes[key]
+
+
+def invalidate_candidate_indexes(instance):
+    """Marks any indexes built from the supplied model instance as stale.
+    """
+    for index in _candidate_indexes.values():
+        if isinstance(instance, index.source_models):
+            index.invalidate()
+
+
+def get_source_models(index_class, freelancer_model):
+    """Returns the models whose saves make the index of the supplied class,
+    for the supplied freelancer model, stale.  Saves of a freelancer are
+    sent by its own model, so this includes the freelancer model as well
+    as the index's source_models.
+    """
+    return set(index_class.source_models) | {freelancer_model}
+
+
+def distance_in_miles(latitude_1, longitude_1, latitude_2, longitude_2):
+    """Returns the great circle distance between the two points, in miles.
+    NB this treats the earth as a sphere, so will differ slightly from
+    the distances PostGIS calculates.
+    """
+    latitude_1, longitude_1, latitude_2, longitude_2 = map(math.radians,
+                    (latitude_1, longitude_1, latitude_2, longitude_2))
+    a = math.sin((latitude_2 - latitude_1) / 2) ** 2 + \
+        math.cos(latitude_1) * math.cos(latitude_2) * \
+        math.sin((longitude_2 - longitude_1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
+
+
+class CandidateIndex(object):
+    """A compact copy of the fields that job matching filters on, for all
+    the published freelancers of a particular model.
+
+    The fields are stored as parallel arrays, one item per freelancer.
+    """
+    # Saving instances of these models will invalidate the index
+    source_models = (Freelancer, Availability)
+
+    def __init__(self, freelancer_model):
+        self.freelancer_model = freelancer_model
+        self.built = None
+        # Held while searching, so a search in one thread never sees the
+        # index half rebuilt by another (e.g. in a multi-threaded worker)
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        self.built = None
+
+    def is_stale(self):
+        return self.built is None or (time.time() - self.built) > \
+                            getattr(settings, 'JOB_MATCHING_INDEX_MAX_AGE', 300)
+
+    fields = ('pk', 'postcode_id', 'travel_distance', 'years_experience',
+              'minimum_pay_per_hour', 'availability_mask')
+
+    def get_rows(self):
+        """Returns the values for each published freelancer,
+        in the order of self.fields.
+        """
+        return self.freelancer_model.published_objects.values_list(
+                                            *self.fields).order_by('pk')
+
+    def build(self):
+        "Builds the index from the database."
+        rows = list(self.get_rows())
+
+        points = dict((postcode.pk, postcode.point) for postcode in
+                        Postcode.objects.filter(pk__in=set(
+                            row[1] for row in rows if row[1])).only('point'))
+
+        self.pks = array('l')
+        self.latitudes = array('d')
+        self.longitudes = array('d')
+        self.travel_distances = array('H')
+        self.years_experience = array('H')
+        self.minimum_pay_pence = array('l')
+        # Python 2's array module has no 64 bit type, so the 35 bit
+        # availability masks are stored in a list
+        self.availability_masks = []
+
+        for (pk, postcode_id, travel_distance, years_experience,
+                minimum_pay_per_hour, availability_mask) in rows:
+            self.pks.append(pk)
+            point = points.get(postcode_id)
+            # Freelancers without a postcode have NaN coordinates
+            self.latitudes.append(point.y if point else float('nan'))
+            self.longitudes.append(point.x if point else float('nan'))
+            self.travel_distances.append(travel_distance)
+            self.years_experience.append(years_experience)
+            # Store the pay in pence, to avoid comparing floats
+            self.minimum_pay_pence.append(int(round(getattr(
+                minimum_pay_per_hour, 'amount', minimum_pay_per_hour) * 100)))
+            self.availability_masks.append(availability_mask)
+
+        self.built = time.time()
+
+    def search(self, search_terms, availability_mask=None):
+        """Returns a list of the pks of the freelancers matching the supplied
+        JobMatcher search terms.  If the search terms include a postcode,
+        the list is ordered by distance.
+
+        Optionally pass availability_mask to only include freelancers
+        available for every shift in the mask.
+        """
+        with self.lock:
+            if self.is_stale():
+                self.build()
+            return self._search(search_terms, availability_mask)
+
+    def _search(self, search_terms, availability_mask):
+        indexes = xrange(len(self.pks))
+
+        if search_terms.get('years_experience'):
+            years_experience = int(search_terms['years_experience'])
+            indexes = [i for i in indexes
+                       if self.years_experience[i] >= years_experience]
+
+        if availability_mask:
+            indexes = [i for i in indexes
+                if self.availability_masks[i] & availability_mask \
+                                                    == availability_mask]
+
+        if search_terms.get('client_pay_per_hour'):
+            pay_pence = int(round(client_to_freelancer_rate(
+                        search_terms['client_pay_per_hour']).amount * 100))
+            indexes = [i for i in indexes
+                       if self.minimum_pay_pence[i] <= pay_pence]
+
+        indexes = self.filter_indexes(indexes, search_terms)
+
+        if search_terms.get('postcode'):
+            point = search_terms['postcode'].point
+            distances = dict((i, distance_in_miles(point.y, point.x,
+                                    self.latitudes[i], self.longitudes[i]))
+                             for i in indexes)
+            if search_terms.get('respect_travel_distance'):
+                # NaN distances (no postcode) fail the comparison
+                indexes = [i for i in indexes
+                           if distances[i] <= self.travel_distances[i]]
+            # Order by distance, putting any freelancers without a postcode
+            # last (as the database does)
+            indexes = sorted(indexes, key=lambda i: (math.isnan(distances[i]),
+                                                     distances[i]))
+
+        return [self.pks[i] for i in indexes]
+
+    def filter_indexes(self, indexes, search_terms):
+        """Hook for subclasses to filter by any additional search terms.
+        Should return the indexes of the freelancers that match.
+        """
+        return indexes
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import calendar
+
+DAYS = [day.lower() for day in calendar.day_name]
+SHIFTS = ['early_morning', 'morning', 'afternoon', 'evening', 'night']
+
+
+def datamigration(apps, schema_editor):
+    """Populates the freelancers' availability masks from their availability.
+    NB this duplicates Availability.get_mask(), as the historical model
+    doesn't have the method.
+    """
+    Availability = apps.get_model('booking', 'Availability')
+    Freelancer = apps.get_model('freelancer', 'Freelancer')
+    for availability in Availability.objects.all():
+        mask = 0
+        for day_index, day in enumerate(DAYS):
+            for shift_index, shift in enumerate(SHIFTS):
+                if getattr(availability, '%s_%s' % (day, shift)):
+                    mask |= 1 << (day_index * len(SHIFTS) + shift_index)
+        Freelancer.objects.filter(pk=availability.freelancer_id).update(
+                                                    availability_mask=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('freelancer', '0021_freelancer_availability_mask'),
+        ('booking', '0011_invitation_date_declined'),
+    ]
+
+    operations = [
+        migrations.RunPython(datamigration),
+    ]
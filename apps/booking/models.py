@@ -6,6 +6,7 @@ from datetime import date, time
 import calendar
 from apps.freelancer.models import Freelancer
 from apps.job.models import JobRequest
+from apps.core import badges
 from .signals import invitation_applied
 
 
@@ -335,27 +336,90 @@ class Availability(models.Model):
                     return shift
         raise ValueError('Could not find shift for time %s.' % given_time)
 
+    @classmethod
+    def get_bit(cls, day, shift):
+        """Returns the bit used for the day and shift in the freelancer's
+        availability mask.  Days and shifts are the names in DAYS and SHIFTS:
+
+            Availability.get_bit('monday', 'evening')
+        """
+        return 1 << (cls.DAYS.index(day) * len(cls.SHIFTS)
+                     + cls.SHIFTS.index(shift))
+
+    def get_mask(self):
+        "Returns the availability as an integer, with a bit for each shift."
+        mask = 0
+        for day in self.DAYS:
+            for shift in self.SHIFTS:
+                if getattr(self, '%s_%s' % (day, shift)):
+                    mask |= self.get_bit(day, shift)
+        return mask
+
+    def save(self, *args, **kwargs):
+        super(Availability, self).save(*args, **kwargs)
+        self.update_freelancer_mask(self.get_mask())
+
+    def delete(self, *args, **kwargs):
+        super(Availability, self).delete(*args, **kwargs)
+        self.update_freelancer_mask(0)
+
+    def update_freelancer_mask(self, mask):
+        """Keeps the freelancer's denormalized availability mask
+        in sync with this availability."""
+        Freelancer.objects.filter(pk=self.freelancer_id).update(
+                                                    availability_mask=mask)
+        # Update the freelancer instance too, if it's been loaded, so it
+        # doesn't save a stale mask later on
+        cache_name = self._meta.get_field('freelancer').get_cache_name()
+        if hasattr(self, cache_name):
+            getattr(self, cache_name).availability_mask = mask
+
     class Meta:
         verbose_name_plural = "Availability"
 
 
 
+def _get_booking_count(job_request):
+    """Returns the number of bookings for the job request, using the
+    annotation from JobRequestQuerySet.with_booking_stats() if present.
+    """
+    if hasattr(job_request, 'booking_count'):
+        return job_request.booking_count
+    return job_request.bookings.count()
+
+def _get_invitation_count(job_request):
+    """Returns the number of invitations for the job request, using the
+    annotation from JobRequestQuerySet.with_booking_stats() if present.
+    """
+    if hasattr(job_request, 'invitation_count'):
+        return job_request.invitation_count
+    return job_request.invitations.count()
+
+def _get_undeclined_application_count(job_request):
+    """Returns the number of undeclined applications for the job request,
+    using the annotation from JobRequestQuerySet.with_booking_stats()
+    if present.
+    """
+    if hasattr(job_request, 'undeclined_application_count'):
+        return job_request.undeclined_application_count
+    return job_request.invitations.undeclined_applications().count()
+
+
 def _is_full(self):
     "Returns whether or not the job request is fully booked."
-    return self.bookings.count() >= self.number_of_freelancers
+    return _get_booking_count(self) >= self.number_of_freelancers
 JobRequest.is_full = property(_is_full)
 
 def _number_of_invited_freelancers(self):
     """ Returns the number of invited freelancers for specific job request.
     """
-    return self.invitations.count()
+    return _get_invitation_count(self)
 JobRequest.number_of_invited_freelancers = property(_number_of_invited_freelancers)
 
 def _number_of_applied_freelancers(self):
     """ Returns the number of applied freelancers for specific job request.
     """
-    undeclined_applications = self.invitations.undeclined_applications()
-    return undeclined_applications.count()
+    return _get_undeclined_application_count(self)
 JobRequest.number_of_applied_freelancers = property(_number_of_applied_freelancers)
 
 
@@ -363,26 +427,38 @@ def _has_freelancers_waiting_acceptance(self):
     """ Returns whether or not job request has any applied freelancers
     waiting to be accepted.
     """
-    undeclined_applications = self.invitations.undeclined_applications()
-    booked_freelancers = self.bookings.get_queryset()
-    return booked_freelancers.count() < undeclined_applications.count()
+    return _get_booking_count(self) < _get_undeclined_application_count(self)
 JobRequest.has_freelancers_waiting_acceptance = property(_has_freelancers_waiting_acceptance)
 
 def _has_enough_applications(self):
     """Returns whether or not the job request has received enough applications
     to be suitable for confirmation.
     """
-    undeclined_applications = self.invitations.undeclined_applications()
-    return undeclined_applications.count() >= self.number_of_freelancers
+    return _get_undeclined_application_count(self) >= \
+                                                    self.number_of_freelancers
 JobRequest.has_enough_applications = property(_has_enough_applications)
 
 
 def get_job_requests_pending_confirmation():
     """Returns all the job requests that are pending confirmation from staff.
     """
-    # TODO - this should be optimised!
-    pending_job_request_ids = []
-    for job_request in JobRequest.objects.filter(status=JobRequest.STATUS_OPEN):
-        if job_request.has_enough_applications:
-            pending_job_request_ids.append(job_request.id)
-    return JobRequest.objects.filter(id__in=pending_job_request_ids)
+    return JobRequest.objects.pending_confirmation().with_booking_stats()
+
+
+@badges.register('freelancer_open_invitations', role='freelancer')
+def count_open_invitations_for_freelancer(user):
+    return Invitation.objects.can_be_applied_to_by_freelancer(
+                                                    user.freelancer).count()
+
+
+def get_user_ids_for_job_request(job_request_id):
+    """Returns the ids of the users involved in the job request with the
+    supplied id: its client, and the freelancers invited to or booked on it.
+    """
+    user_ids = set(JobRequest.objects.filter(pk=job_request_id
+                        ).values_list('client__user_id', flat=True))
+    user_ids.update(Invitation.objects.filter(jobrequest_id=job_request_id
+                        ).values_list('freelancer__user_id', flat=True))
+    user_ids.update(Booking.objects.filter(jobrequest_id=job_request_id
+                        ).values_list('freelancer__user_id', flat=True))
+    return user_ids
@@ -1,19 +1,27 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save
-from apps.core.email import send_mail
+from django.db.models.signals import post_save, post_delete
+from apps.core.email import send_mail, send_mass_mail
 from django.conf import settings
 from django.template.loader import render_to_string
-from .models import Booking
+from .models import Booking, get_user_ids_for_job_request
 from apps.job.models import JobRequest
 from apps.job.signals import job_request_changed
-from .signals import (invitation_created, invitation_applied,
-                      booking_created, invitation_declined)
+from apps.job import service_from_class
+from apps.service import services
+from .signals import (invitation_created, invitations_created,
+                      invitation_applied, booking_created, invitation_declined)
 from django_fsm.signals import post_transition
 from apps.notification.models import Notification
-from apps.notification.sms import send_sms
+from apps.notification.sms import send_sms, send_sms_batch
 from . import tasks
+from .index import invalidate_candidate_indexes, get_source_models
+from apps.core.badges import invalidate_badge_counts
+from apps.freelancer.models import Freelancer
 
 from datetime import date
+import logging
+
+logger = logging.getLogger('project')
 
 
 @receiver(post_transition)
@@ -31,9 +39,69 @@ def invite_matching_freelancers_on_job_request_changed(sender, instance,
                                          changed_data, silent, **kwargs):
     """Invites any freelancers who match the job request, and who were
     not previously invited, when an open job request is edited.
+
+    Skips the matching if none of the changes affect who would match.
     """
     if instance.status == JobRequest.STATUS_OPEN:
-        tasks.invite_matching_freelancers(instance)
+        service = service_from_class(instance.__class__)
+        matching_fields = service.job_matching_form.job_matcher\
+                                .get_changed_matching_fields(changed_data)
+        if matching_fields:
+            previous_data = kwargs.get('previous_data') or {}
+            tasks.invite_matching_freelancers(instance,
+                previous_data=dict((name, previous_data.get(name))
+                                   for name in matching_fields))
+
+
+def invalidate_candidate_indexes_on_change(sender, instance, **kwargs):
+    "Makes sure the in-memory job matching indexes don't go stale."
+    invalidate_candidate_indexes(instance)
+
+# Connected for just the models each service's index is built from
+for service in services.values():
+    index_class = service.job_matching_form.job_matcher.candidate_index_class
+    if index_class:
+        for model in get_source_models(index_class, service.freelancer_model):
+            post_save.connect(invalidate_candidate_indexes_on_change,
+                              sender=model)
+            post_delete.connect(invalidate_candidate_indexes_on_change,
+                                sender=model)
+
+
+@receiver(invitations_created)
+def invalidate_badge_counts_on_invitations_created(sender, invitations,
+                                                   **kwargs):
+    "Clears the open invitation counts of the freelancers invited."
+    invalidate_badge_counts(Freelancer.objects.filter(
+            pk__in=[invitation.freelancer_id for invitation in invitations]
+        ).values_list('user_id', flat=True))
+
+
+@receiver([invitation_created, invitation_applied])
+def invalidate_badge_counts_on_invitation_changed(sender, invitation,
+                                                  **kwargs):
+    "Clears the open invitation counts of the freelancer invited."
+    invalidate_badge_counts(Freelancer.objects.filter(
+            pk=invitation.freelancer_id).values_list('user_id', flat=True))
+
+
+@receiver(booking_created)
+def invalidate_badge_counts_on_booking_created(sender, booking, **kwargs):
+    """Clears the badge counts of everyone involved in the job request;
+    once it is fully booked, the other invitations are no longer open.
+    """
+    invalidate_badge_counts(get_user_ids_for_job_request(
+                                                        booking.jobrequest_id))
+
+
+@receiver(post_transition)
+def invalidate_badge_counts_on_job_request_transition(sender, instance,
+                                                      **kwargs):
+    """Clears the badge counts of everyone involved in a job request when
+    its status changes, e.g. when it is complete and needs feedback.
+    """
+    if isinstance(instance, JobRequest):
+        invalidate_badge_counts(get_user_ids_for_job_request(instance.pk))
 
 
 @receiver(invitation_applied)
@@ -57,8 +125,10 @@ def update_freelancers_last_applied(sender, invitation, **kwargs):
     """
     Updates freelancer's last_applied date
     """
+    # Update without saving the rest of the freelancer
     invitation.freelancer.last_applied = date.today()
-    invitation.freelancer.save()
+    Freelancer.objects.filter(pk=invitation.freelancer_id).update(
+                            last_applied=invitation.freelancer.last_applied)
 
 
 @receiver(booking_created)
@@ -153,35 +223,74 @@ def notify_admin_when_invitation_applied(sender, invitation, **kwargs):
 @receiver(invitation_created)
 def notify_freelancer_on_invitation(sender, invitation, **kwargs):
     "Notifies the freelancer when they are invited to book a job."
+    notify_freelancers_on_invitations(sender, [invitation])
+
+
+@receiver(invitations_created)
+def notify_freelancers_on_invitations(sender, invitations, **kwargs):
+    "Notifies each of the freelancers in a batch of invitations."
+    invitations_by_job_request = {}
+    emails = []
+    sms_messages = []
+    # Share the rendered job request summaries between the emails
+    fragment_cache = {}
+    for invitation in invitations:
+        try:
+            emails.append(get_invitation_email(invitation, fragment_cache))
+            if invitation.freelancer.is_active:
+                sms_messages.append((invitation.freelancer.user,
+                    render_to_string('booking/sms/freelancer_invitation.txt',
+                                     {'object': invitation,
+                                      'job_request': invitation.jobrequest}),
+                    invitation.jobrequest))
+        except Exception as e:
+            # Don't let one failure stop the rest of the batch
+            logger.exception(e)
+        invitations_by_job_request.setdefault(invitation.jobrequest_id,
+                                              []).append(invitation)
+
+    # Send the emails and SMS messages together.  Each step is attempted
+    # whatever happens to the others, and failures aren't raised, so they
+    # don't stop the invitations (or the next wave) going out.
+    try:
+        send_mass_mail(emails, 'email/base',
+                       from_email=settings.BOOKINGS_FROM_EMAIL)
+    except Exception as e:
+        logger.exception(e)
+    try:
+        send_sms_batch(sms_messages)
+    except Exception as e:
+        logger.exception(e)
+
+    # Create notifications, pushing them together
+    for job_request_invitations in invitations_by_job_request.values():
+        try:
+            Notification.objects.bulk_notify(
+                [invitation.freelancer.user
+                 for invitation in job_request_invitations],
+                message='A new job was just posted.',
+                category='freelancer_invitation',
+                related_object=job_request_invitations[0].jobrequest)
+        except Exception as e:
+            logger.exception(e)
+
+
+def get_invitation_email(invitation, fragment_cache=None):
+    """Returns the email about an invitation for the freelancer,
+    as a (to, subject, context) tuple for send_mass_mail."""
     title = 'A new job was just posted'
     content = render_to_string(
         'booking/email/includes/freelancer_invitation.html',
         {
             'object': invitation,
-            'job_request': invitation.jobrequest
+            'job_request': invitation.jobrequest,
+            'email_fragment_cache': fragment_cache,
          }
     )
-    send_mail(invitation.freelancer.user.email,
-              title,
-              'email/base',
-              {'title': title,
-               'content': content},
-              from_email=settings.BOOKINGS_FROM_EMAIL)
-
-    # Create notification
-    Notification.objects.create(
-            message='A new job was just posted.',
-            category='freelancer_invitation',
-            related_object=invitation.jobrequest,
-            user=invitation.freelancer.user)
-
-
-    if(invitation.freelancer.is_active):
-        send_sms(invitation.freelancer.user,
-                 render_to_string('booking/sms/freelancer_invitation.txt',
-                                  {'object': invitation,
-                                   'job_request': invitation.jobrequest}),
-                 invitation.jobrequest)
+    return (invitation.freelancer.user.email,
+            title,
+            {'title': title,
+             'content': content})
 
 # @receiver(booking_created)
 # def notify_client_on_booking(sender, booking, **kwargs):
@@ -7,6 +7,10 @@ booking_created = django.dispatch.Signal(providing_args=['booking'])
 # Signal that is sent when a freelancer is invited
 invitation_created = django.dispatch.Signal(providing_args=['invitation'])
 
+# Signal that is sent when a batch of freelancers are invited automatically.
+# Receivers of invitation_created should usually handle this one too.
+invitations_created = django.dispatch.Signal(providing_args=['invitations'])
+
 # Signal that is sent when a job is applied for
 invitation_applied = django.dispatch.Signal(providing_args=['invitation'])
 
@@ -1,42 +1,164 @@
 import time
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from django.db import transaction, IntegrityError
 from huey.djhuey import db_task
 from .models import Invitation
-from .signals import invitation_created
+from .signals import invitation_created, invitations_created
 from apps.job import service_from_class
+from apps.job.models import JobRequest
 
 import logging
 
 logger = logging.getLogger('project')
 
 @db_task()
-def invite_matching_freelancers(job_request):
+def invite_matching_freelancers(job_request, previous_data=None):
     """Invites all suitable freelancers for the supplied job request.
 
     This can be called on a job request that has previously had invitations
     sent out.  In that case, it will simply skip inviting anyone who has
     already been invited.
+
+    If the job request has been changed, previous_data can be passed, which
+    should be the previous values of the changed matching fields.  If the
+    changes only loosen the criteria, we only search for the freelancers
+    who are newly eligible.
+
+    Only the best ranked JOB_MATCHING_INVITATION_LIMIT freelancers are
+    invited, if the setting is set.  If JOB_MATCHING_WAVE_SIZE is set,
+    the freelancers are invited in waves of that size, best ranked first;
+    see invite_next_wave.  Starting a new chain of waves supersedes any
+    earlier one for the job request, which then stops.
+    """
+    with transaction.atomic():
+        chain = JobRequest.objects.select_for_update().filter(
+                                pk=job_request.pk).values_list(
+                                'invitation_chain', flat=True)[0] + 1
+        JobRequest.objects.filter(pk=job_request.pk).update(
+                                                    invitation_chain=chain)
+    invite_wave(job_request, previous_data, wave=1, chain=chain)
+
+
+@db_task()
+def invite_next_wave(job_request_id, previous_data, wave, chain=None):
+    """Invites the next wave of matching freelancers for the job request
+    with the supplied id, provided it's still open and short of applications,
+    and the chain of waves hasn't been superseded by a later one.
+    """
+    try:
+        job_request = JobRequest.objects.get(pk=job_request_id)
+    except JobRequest.DoesNotExist:
+        return
+
+    if chain is not None and job_request.invitation_chain != chain:
+        print('[%s] Skipped inviting wave %d for %s, as it has been '
+              'superseded.' % (time.ctime(), wave, str(job_request)))
+        return
+
+    if job_request.status != JobRequest.STATUS_OPEN or \
+                                        job_request.has_enough_applications:
+        print('[%s] Skipped inviting wave %d for %s.' % (time.ctime(), wave,
+                                                         str(job_request)))
+        return
+
+    invite_wave(job_request, previous_data, wave, chain)
+
+
+def invite_wave(job_request, previous_data, wave, chain):
+    """Invites the matching freelancers up to and including the supplied
+    wave, skipping those already invited, then schedules the next wave
+    if there may be more freelancers to invite.
     """
     service = service_from_class(job_request.__class__)
     matcher = service.job_matching_form.job_matcher(job_request)
-    freelancers = matcher.get_results(ignore_availability=True)
-    invited_count = 0
-    for freelancer in freelancers:
+
+    limit = getattr(settings, 'JOB_MATCHING_INVITATION_LIMIT', None)
+    wave_size = getattr(settings, 'JOB_MATCHING_WAVE_SIZE', None)
+    # Whether there may be more freelancers to invite in another wave
+    more_waves = False
+    if wave_size:
+        wave_limit = wave_size * wave
+        if not limit or wave_limit < limit:
+            limit = wave_limit
+            more_waves = True
+
+    freelancer_ids = matcher.get_result_ids(ignore_availability=True,
+                                            previous_data=previous_data,
+                                            limit=limit)
+    invitations = create_invitations(job_request, freelancer_ids)
+
+    print('[%s] Invited %d of %d matching freelancers for %s (wave %d).' \
+                                                        % (time.ctime(),
+                                                        len(invitations),
+                                                        len(freelancer_ids),
+                                                        str(job_request),
+                                                        wave))
+
+    if more_waves and len(freelancer_ids) == limit:
+        invite_next_wave.schedule(args=(job_request.pk, previous_data,
+                                        wave + 1, chain),
+                    eta=timezone.now() + timedelta(
+                            minutes=settings.JOB_MATCHING_WAVE_INTERVAL))
+
+
+def create_invitations(job_request, freelancer_ids):
+    """Invites the freelancers with the supplied ids to the job request,
+    skipping any who have already been invited, and dispatches the
+    invitations_created signal for the new invitations.
+
+    Returns a list of the new invitations.
+    """
+    already_invited = set(Invitation.objects.filter(jobrequest=job_request
+                                ).values_list('freelancer_id', flat=True))
+    new_freelancer_ids = [pk for pk in freelancer_ids
+                          if pk not in already_invited]
+    if not new_freelancer_ids:
+        return []
+
+    try:
+        with transaction.atomic():
+            Invitation.objects.bulk_create([
+                Invitation(freelancer_id=pk, jobrequest=job_request)
+                for pk in new_freelancer_ids])
+    except IntegrityError:
+        # Someone else invited one of the freelancers in the meantime
+        # (e.g. an admin, manually); fall back to inviting them one by one.
+        return _create_invitations_individually(job_request,
+                                                new_freelancer_ids)
+
+    # bulk_create doesn't set the primary keys, so fetch the invitations
+    # again, along with what's needed to notify the freelancers
+    invitations = list(Invitation.objects.filter(jobrequest=job_request,
+                                    freelancer_id__in=new_freelancer_ids
+                                ).select_related('freelancer__user'))
+    for invitation in invitations:
+        # Share the (polymorphic) job request we already have
+        invitation.jobrequest = job_request
+
+    invitations_created.send(sender=invite_matching_freelancers,
+                             invitations=invitations)
+    return invitations
+
+
+def _create_invitations_individually(job_request, freelancer_ids):
+    """Slower version of create_invitations(), that can cope with
+    invitations being created concurrently.
+    """
+    invitations = []
+    for freelancer_id in freelancer_ids:
         try:
             invitation, created = Invitation.objects.get_or_create(
-                                                   freelancer=freelancer,
+                                                   freelancer_id=freelancer_id,
                                                    jobrequest=job_request)
             if created:
                 # Only issue the invitation signal if we created an invitation;
                 # in case the user had already been invited
-                invited_count += 1
+                invitations.append(invitation)
                 invitation_created.send(sender=invite_matching_freelancers,
-                                    invitation=invitation)
+                                        invitation=invitation)
 
         except Exception as e:
-            logger.error('[%s] Failed to invite freelancer %d for job request %d: %s' % (time.ctime(), freelancer.pk, job_request.pk, str(e)))
-
-    print('[%s] Invited %d of %d matching freelancers for %s.' \
-                                                        % (time.ctime(),
-                                                        invited_count,
-                                                        freelancers.count(),
-                                                        str(job_request)))
+            logger.error('[%s] Failed to invite freelancer %d for job request %d: %s' % (time.ctime(), freelancer_id, job_request.pk, str(e)))
+    return invitations
@@ -1,6 +1,7 @@
 from django import template
 from ..models import Booking, Availability, Invitation
 from ..forms import AvailabilityForm
+from apps.core.badges import get_badge_counts
 
 register = template.Library()
 
@@ -63,7 +64,5 @@ def availability_form_for_freelancer(freelancer):
 
 @register.assignment_tag(takes_context=True)
 def freelancer_open_invitations_count(context):
-    # TODO - this would be a good candidate for caching
-    return Invitation.objects.can_be_applied_to_by_freelancer(
-                                context['request'].user.freelancer).count()
+    return get_badge_counts(context['request'])['freelancer_open_invitations']
 
@@ -1,8 +1,19 @@
 import calendar
-from .models import Availability
+import operator
+from datetime import date, timedelta
+from django.db.models import Q
+from .models import Availability, Invitation
 from apps.job.models import JobRequest
 from apps.freelancer.models import Freelancer, client_to_freelancer_rate
+from apps.location.models import Postcode
+from apps.feedback.models import BookingFeedback, FreelancerRating
 from apps.job import service_from_class
+from .index import CandidateIndex, get_candidate_index
+
+
+# Used to convert the freelancers' travel distances into the units
+# PostGIS uses for geography types
+METRES_PER_MILE = 1609.344
 
 
 class JobMatcher(object):
@@ -17,6 +28,33 @@ class JobMatcher(object):
     """
     flat_fields = ('date', 'client_pay_per_hour', 'years_experience')
 
+    # Whether the results need to be made distinct, because the filters
+    # join to tables with more than one row per freelancer
+    distinct_results = True
+
+    # The in-memory index that can answer searches for this matcher
+    # (see apps.booking.index), or None if the matcher filters on fields that
+    # the index doesn't hold.
+    candidate_index_class = CandidateIndex
+
+    # How much each part of the match score counts towards the ranking.
+    # Each part is a number between 0 and 1.
+    score_weights = {
+        'distance': 4,
+        'rating': 3,
+        'acceptance_rate': 2,
+        'active': 1,
+    }
+    # The acceptance rate assumed for freelancers who haven't been
+    # invited to anything yet
+    default_acceptance_rate = 0.5
+
+    # The job request form fields that affect which freelancers are invited
+    # to a job.  (The date and time only affect availability, which is
+    # ignored when inviting.)
+    matching_fields = ('client_pay_per_hour', 'years_experience',
+                       'raw_postcode')
+
     def __init__(self, job_request, cleaned_data=None):
         # We always need to know what job request we're searching for,
         # so we can determine the correct kind of freelancer
@@ -39,6 +77,8 @@ class JobMatcher(object):
 
         # Other fields
         self.search_terms['raw_postcode'] = str(self.job_request.postcode)
+        self.search_terms['postcode'] = self.job_request.postcode
+        self.search_terms['respect_travel_distance'] = True
         self.search_terms['shift'] = Availability.shift_from_time(
                                                 self.job_request.start_time)
 
@@ -48,8 +88,7 @@ class JobMatcher(object):
         Optionally, can ignore the availability provided by the freelancers.
         """
 
-        service = service_from_class(self.job_request.__class__)
-        result_class = service.freelancer_model
+        result_class = self.get_freelancer_model()
         results = result_class.published_objects.all()
 
         results = self.filter_by_years_experience(results)
@@ -57,10 +96,103 @@ class JobMatcher(object):
             results = self.filter_by_availability(results)
         results = self.filter_by_pay_per_hour(results)
         results = self.filter_by_location(results)
+        results = self.rank_results(results)
+        # Load the ratings used to display each freelancer's average score
+        results = results.prefetch_related('rating_summary')
 
         # Return unique results
-        return results.distinct()
+        if self.distinct_results:
+            results = results.distinct()
+        return results
+
+    def get_result_ids(self, ignore_availability=False, previous_data=None,
+                       limit=None):
+        """Returns the pks of the freelancers that match the search terms.
+        If the in-memory candidate index is active, the search is answered
+        from that; otherwise it queries the database.
+
+        If previous_data is supplied, only returns the freelancers who are
+        newly eligible (see filter_by_newly_eligible).  If limit is
+        supplied, only returns that many, highest ranked first.
+        """
+        index = None
+        if self.candidate_index_class and not previous_data:
+            index = get_candidate_index(self.candidate_index_class,
+                                        self.get_freelancer_model())
+        if index:
+            if ignore_availability:
+                availability_mask = None
+            else:
+                availability_mask = self.get_availability_mask()
+            result_ids = index.search(self.search_terms, availability_mask)
+            if not limit or len(result_ids) <= limit:
+                return result_ids
+            # The index can't rank, so rank the candidates in the database
+            results = self.rank_results(
+                self.get_freelancer_model().objects.filter(pk__in=result_ids))
+        else:
+            results = self.get_results(ignore_availability)
+            if previous_data:
+                results = self.filter_by_newly_eligible(results,
+                                                        previous_data)
+
+        if not limit:
+            # We only need the ids; clear the ordering so it isn't
+            # needed in the query
+            return list(results.order_by().values_list('pk', flat=True))
 
+        return [pk for pk, match_score in results.order_by('-match_score'
+                            ).values_list('pk', 'match_score')[:limit]]
+
+    def get_freelancer_model(self):
+        "Returns the kind of freelancer we're matching the job request with."
+        service = service_from_class(self.job_request.__class__)
+        return service.freelancer_model
+
+
+    @classmethod
+    def get_changed_matching_fields(cls, changed_data):
+        """Returns the fields in the supplied form changed_data that
+        affect which freelancers match."""
+        return [name for name in changed_data if name in cls.matching_fields]
+
+    def filter_by_newly_eligible(self, results, previous_data):
+        """Given the results of a search, narrows them down to the freelancers
+        who would not have matched before the job request was changed.
+
+        previous_data is a dictionary of the previous values of the changed
+        matching fields.  This only works where every change loosens the
+        criteria (e.g. lowering the years of experience, or raising
+        the pay); if not, the results are returned unchanged.
+        """
+        previous_filters = []
+        for name, previous_value in previous_data.items():
+            previous_filter = self.get_previous_filter(name, previous_value)
+            if previous_filter is None:
+                return results
+            previous_filters.append(previous_filter)
+
+        if not previous_filters:
+            return results
+
+        # Exclude the freelancers who would have matched
+        # all the previous criteria
+        return results.exclude(reduce(operator.and_, previous_filters))
+
+    def get_previous_filter(self, name, previous_value):
+        """Returns a Q object matching the freelancers who satisfied the
+        previous value of a field, or None if the change to the field
+        wasn't a loosening of the criteria.
+        """
+        if name == 'years_experience':
+            if self.search_terms['years_experience'] < previous_value:
+                return Q(years_experience__gte=previous_value)
+        elif name == 'client_pay_per_hour':
+            if previous_value and \
+                    self.search_terms['client_pay_per_hour'] > previous_value:
+                return Q(minimum_pay_per_hour__lte=client_to_freelancer_rate(
+                                                            previous_value))
+        return None
 
     def filter_by_years_experience(self, results):
         "Filters by minimum years of experience."
@@ -72,21 +204,34 @@ class JobMatcher(object):
 
     def filter_by_availability(self, results):
         "Filters by availability, if it's been searched for."
+        availability_mask = self.get_availability_mask()
+        if availability_mask:
+            results = self.filter_by_availability_mask(results,
+                                                       availability_mask)
+        return results
 
+    def get_availability_mask(self):
+        """Returns the availability bit for the searched date and shift,
+        or None if availability hasn't been searched for."""
         if self.search_terms['date']:
-
             # Get day of week for that date
             day_name = calendar.day_name[
                                 self.search_terms['date'].weekday()].lower()
+            return Availability.get_bit(day_name, self.search_terms['shift'])
+        return None
 
-            # Build filter kwargs
-            field_name = '%s_%s' % (day_name, self.search_terms['shift'])
-            filter_kwargs = {'availability__%s' % field_name: True}
-
-            # Filter
-            results = results.filter(**filter_kwargs)
+    def filter_by_availability_mask(self, results, mask):
+        """Filters by freelancers who are available for every shift in
+        the supplied mask (see Availability.get_bit()).  Bits can be combined
+        to search across several shifts or days at once.
 
-        return results
+        This uses the freelancer's denormalized availability_mask,
+        to avoid joining onto the availability table.
+        """
+        return results.extra(
+            where=['"%s"."availability_mask" & %%s = %%s' \
+                                                % Freelancer._meta.db_table],
+            params=[mask, mask])
 
     def filter_by_pay_per_hour(self, results):
         """Filters the results based on the minimum pay per hour.
@@ -108,16 +253,120 @@ class JobMatcher(object):
             # Specific include distances so the template knows
             self.include_distances = True
             searched_point = self.search_terms['postcode'].point
+
+            if self.search_terms.get('respect_travel_distance'):
+                # Filter by only those freelancers whose travel distance
+                # works with the postcode supplied
+                results = self.filter_by_travel_distance(results,
+                                                         searched_point)
+
             results = results.distance(searched_point,
                                        field_name='postcode__point')\
                         .order_by('distance')
 
-            # if self.search_terms['respect_travel_distance']:
-                # Filter by only those drivers whose travel distance works
-                # with the postcode supplied
-                # TODO - get this working with their personal distance settings
-                # http://stackoverflow.com/questions/9547069/geodjango-distance-filter-with-distance-value-stored-within-model-query
-                # results = results.filter(
-                #      postcode__point__distance_lte=(searched_point, D(mi=4)))
-
         return results
+
+    def rank_results(self, results):
+        """Annotates the results with a match_score and orders them by it,
+        best first (and then by distance, if searching by postcode).
+
+        The score is a weighted sum (see score_weights) of how close the
+        freelancer is, their average rating, how often they apply for
+        the jobs they're invited to, and whether they've been active
+        recently.
+        """
+        parts, params = [], []
+        for name, (sql, part_params) in self.get_score_parts().items():
+            parts.append('%s * (%s)' % (self.score_weights[name], sql))
+            params.extend(part_params)
+
+        results = results.extra(select={'match_score': ' + '.join(parts)},
+                                select_params=params)
+        if self.search_terms.get('postcode'):
+            return results.order_by('-match_score', 'distance')
+        return results.order_by('-match_score')
+
+    def get_score_parts(self):
+        """Returns a dictionary of the SQL (and parameters) for each part of
+        the match score, keyed by the names in score_weights.  Each part
+        is a number between 0 and 1.
+
+        The parts that depend on other tables are correlated subqueries,
+        so they don't affect which rows are returned.
+        """
+        table_names = {
+            'freelancer_table': Freelancer._meta.db_table,
+            'postcode_table': Postcode._meta.db_table,
+            'rating_table': FreelancerRating._meta.db_table,
+            'invitation_table': Invitation._meta.db_table,
+        }
+        parts = {}
+
+        if self.search_terms.get('postcode'):
+            # Closer is better, relative to the furthest anyone will travel
+            max_travel_distance = max(distance for distance, label
+                                      in Freelancer.DISTANCE_CHOICES)
+            parts['distance'] = ("""COALESCE(1 - LEAST((
+                SELECT ST_Distance(score_postcode."point"::geography,
+                                   ST_GeomFromEWKT(%%s)::geography)
+                FROM "%(postcode_table)s" score_postcode
+                WHERE score_postcode."id" = "%(freelancer_table)s"."postcode_id"
+            ) / %%s, 1), 0)""" % table_names,
+                [self.search_terms['postcode'].point.ewkt,
+                 max_travel_distance * METRES_PER_MILE])
+
+        # Freelancers without any feedback get the maximum score,
+        # as they do in Freelancer.average_score()
+        parts['rating'] = ("""COALESCE((
+                SELECT score_rating."total"::float
+                                        / NULLIF(score_rating."count", 0)
+                FROM "%(rating_table)s" score_rating
+                WHERE score_rating."freelancer_id" = "%(freelancer_table)s"."id"
+            ), %%s) / %%s""" % table_names,
+            [BookingFeedback.MAX_SCORE, BookingFeedback.MAX_SCORE])
+
+        parts['acceptance_rate'] = ("""COALESCE((
+                SELECT COUNT(score_invitation."date_applied")::float
+                                                    / NULLIF(COUNT(*), 0)
+                FROM "%(invitation_table)s" score_invitation
+                WHERE score_invitation."freelancer_id" = "%(freelancer_table)s"."id"
+            ), %%s)""" % table_names,
+            [self.default_acceptance_rate])
+
+        parts['active'] = ("""CASE WHEN "%(freelancer_table)s"."last_applied"
+                >= %%s THEN 1 ELSE 0 END""" % table_names,
+            [date.today() - timedelta(days=Freelancer.ACTIVE_DAYS)])
+
+        return parts
+
+    def filter_by_travel_distance(self, results, searched_point):
+        """Filters the results by those freelancers who are prepared to
+        travel to the searched point, using each freelancer's own
+        travel_distance.
+
+        GeoDjango can't compare a distance against a value stored in
+        the model, so this is done as an extra WHERE clause.  The first
+        ST_DWithin uses the largest travel distance anyone can choose, so
+        PostGIS can answer it from the geography index on the postcode
+        point; the second then applies the freelancer's own distance to
+        what remains.
+        """
+        max_travel_distance = max(distance for distance, label
+                                  in Freelancer.DISTANCE_CHOICES)
+        where = """EXISTS (
+            SELECT 1 FROM "%(postcode_table)s" travel_postcode
+            WHERE travel_postcode."id" = "%(freelancer_table)s"."postcode_id"
+            AND ST_DWithin(travel_postcode."point"::geography,
+                           ST_GeomFromEWKT(%%s)::geography, %%s)
+            AND ST_DWithin(travel_postcode."point"::geography,
+                           ST_GeomFromEWKT(%%s)::geography,
+                           "%(freelancer_table)s"."travel_distance" * %%s)
+        )""" % {
+            'postcode_table': Postcode._meta.db_table,
+            'freelancer_table': Freelancer._meta.db_table,
+        }
+        return results.extra(where=[where],
+                             params=[searched_point.ewkt,
+                                     max_travel_distance * METRES_PER_MILE,
+                                     searched_point.ewkt,
+                                     METRES_PER_MILE])
@@ -4,6 +4,7 @@ from multiselectfield import MultiSelectField
 from django.conf import settings
 from django.core import validators
 from django.core.urlresolvers import reverse
+from apps.core import roles
 
 
 class Lead(models.Model):
@@ -31,7 +32,7 @@ def _is_client(self):
     Returns whether or not the user account is a client account,
     i.e. has a client profile.
     ."""
-    return Client.objects.filter(user=self).exists()
+    return roles.get_roles(self)['client'] is not None
 User.is_client = property(_is_client)
 
 
@@ -40,10 +41,21 @@ def _client(self):
     Returns the Client for the user.  If it doesn't, raises
     Client.DoesNotExist.
     """
-    return self.client_set.get()
+    client_id = roles.get_roles(self)['client']
+    if client_id is None:
+        raise Client.DoesNotExist
+    return roles.get_profile(self, 'client',
+                             lambda: Client.objects.get(pk=client_id))
 User.client = property(_client)
 
 
+@roles.register('client')
+def get_client_id(user):
+    "Returns the id of the user's client profile, or None."
+    return Client.objects.filter(user=user).values_list('pk',
+                                                        flat=True).first()
+
+
 class Client(models.Model):
     """A client is a person who wishes to book a freelancer.
     """
@@ -1,9 +1,10 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from apps.core.email import send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
 from .models import Client
+from apps.core.roles import invalidate_roles
 
 
 
@@ -39,3 +40,8 @@ def welcome_client_on_sign_up(sender, instance, created, **kwargs):
                    'content': content})
 
 
+@receiver([post_save, post_delete])
+def invalidate_roles_on_client_changed(sender, instance, **kwargs):
+    "Makes sure the user's cached roles don't go stale."
+    if isinstance(instance, Client):
+        invalidate_roles([instance.user_id])
@@ -0,0 +1,89 @@
+"""Per-user badge counts, such as the number of jobs awaiting feedback,
+shown on every page.
+
+Each count is registered by the app that knows how to work it out, along
+with the role (see apps.core.roles) it applies to, if any:
+
+    @badges.register('freelancer_open_invitations', role='freelancer')
+    def count_open_invitations(user):
+        ...
+
+Counts for roles the user doesn't have are 0, without calling the function.
+
+The counts are cached per user (in the default cache, for
+BADGE_COUNT_CACHE_TIMEOUT seconds).  All of a user's counts are fetched from
+the cache together, and only the missing ones are worked out:
+
+    get_badge_counts(request)['freelancer_open_invitations']
+
+Apps should call invalidate_badge_counts with the ids of any users whose
+counts may have changed.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from . import roles
+
+
+# The functions that count each badge, keyed by badge name.  Each is passed
+# the user, who has the badge's role (if it has one).
+_counters = {}
+# The role each badge applies to (or None), keyed by badge name
+_roles = {}
+
+
+def register(name, role=None):
+    """Decorator that registers a function to count the named badge,
+    for users with the supplied role (or for all users, if it's None).
+    """
+    def decorator(fn):
+        _counters[name] = fn
+        _roles[name] = role
+        return fn
+    return decorator
+
+
+def get_cache_key(user_id, name):
+    return 'badge_count:%d:%s' % (user_id, name)
+
+
+def get_badge_counts(request):
+    """Returns a dictionary of all the badge counts for the request's user,
+    keyed by badge name.  The counts are only looked up once per request.
+    """
+    if not hasattr(request, '_badge_counts'):
+        request._badge_counts = get_badge_counts_for_user(request.user)
+    return request._badge_counts
+
+
+def get_badge_counts_for_user(user):
+    """Returns a dictionary of all the badge counts for the user,
+    keyed by badge name.
+    """
+    if not user.is_authenticated():
+        return dict((name, 0) for name in _counters)
+
+    # Counts for roles the user doesn't have are left at 0
+    counts = dict((name, 0) for name in _counters)
+    user_roles = roles.get_roles(user)
+    names = [name for name in _counters
+             if _roles[name] is None or user_roles[_roles[name]] is not None]
+    keys = dict((get_cache_key(user.pk, name), name) for name in names)
+    # (The cache may return None rather than raise, if it's unavailable)
+    cached = cache.get_many(keys.keys()) or {}
+    counts.update((keys[key], count) for key, count in cached.items())
+
+    missing = {}
+    for key, name in keys.items():
+        if key not in cached:
+            counts[name] = missing[key] = _counters[name](user)
+    if missing:
+        cache.set_many(missing, settings.BADGE_COUNT_CACHE_TIMEOUT)
+    return counts
+
+
+def invalidate_badge_counts(user_ids):
+    "Clears the cached badge counts for the supplied users."
+    keys = [get_cache_key(user_id, name)
+            for user_id in set(user_ids) for name in _counters]
+    if keys:
+        cache.delete_many(keys)
@@ -1,13 +1,31 @@
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.conf import settings
-from django.template.loader import render_to_string, select_template
+from django.template import Context
+from django.template.loader import (render_to_string, select_template,
+                                    get_template)
 from .utils import template_names_from_polymorphic_model
+from .executor import run_concurrently
 from smtplib import SMTPRecipientsRefused
 import logging
 
 logger = logging.getLogger('project')
 
 
+# Compiled email templates, keyed by template name
+_template_cache = {}
+
+
+def get_email_template(template_name):
+    """Returns the compiled template, caching it unless we're in DEBUG mode
+    (so template changes are picked up during development).
+    """
+    if settings.DEBUG:
+        return get_template(template_name)
+    if template_name not in _template_cache:
+        _template_cache[template_name] = get_template(template_name)
+    return _template_cache[template_name]
+
+
 def send_mail(to, subject, template_name, context, from_email=None):
     """
     Sends an email to the supplied email address, using
@@ -19,6 +37,101 @@ def send_mail(to, subject, template_name, context, from_email=None):
     Can optionally specify a from_email, otherwise it will use
     CONTACT_EMAIL in the settings.
     """
+    msg = build_message(to, subject, template_name, context, from_email)
+    try:
+        get_email_connection().send_messages([msg])
+    except SMTPRecipientsRefused:
+        # This happens if the domain isn't recognised - we don't
+        # want an exception here
+        logger.error('Failed to send email "%s" to %s.' % (subject, msg.to[0]))
+
+
+def send_mass_mail(messages, template_name, from_email=None):
+    """
+    Sends a batch of emails using the same template.  The emails are sent
+    by up to DELIVERY_CONCURRENCY['email'] threads, each over a single
+    connection to the mail server.
+
+    messages should be a list of (to, subject, context) tuples; the other
+    arguments are as for send_mail().
+
+    Usage:
+
+        fragment_cache = {}
+        send_mass_mail([(freelancer.user.email, subject, {
+                            'content': ..., 'email_fragment_cache':
+                                                        fragment_cache})
+                        for freelancer in freelancers], 'email/base')
+
+    Any email_fragment_cache dictionary in the context is used to
+    render shared fragments (such as job request summaries) only once
+    across the batch; see core_tags.summary_for_email.
+    """
+    msgs = [build_message(to, subject, template_name, context, from_email)
+            for to, subject, context in messages]
+    if not msgs:
+        return
+
+    if getattr(settings, 'NOTIFICATION_OUTBOX_ACTIVE', False):
+        # The outbox must be written to in this thread, so the emails
+        # are saved in the current transaction
+        send_over_connection(msgs)
+    else:
+        # Each thread sends its share of the batch over its own connection
+        run_concurrently('email', msgs, send_over_connection)
+
+
+def send_over_connection(msgs):
+    """Sends the supplied messages over a single connection.
+
+    Failures are logged rather than raised, so one bad message (or a dropped
+    connection) doesn't stop the rest of the batch.  After any failure other
+    than refused recipients, the connection is reopened for the next message.
+    """
+    connection = get_email_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # send_messages will try to open it again
+        logger.exception(e)
+    try:
+        for msg in msgs:
+            try:
+                connection.send_messages([msg])
+            except SMTPRecipientsRefused:
+                # As in send_mail, don't let this stop the rest of the batch
+                logger.error('Failed to send email "%s" to %s.' % (
+                                                    msg.subject, msg.to[0]))
+            except Exception as e:
+                logger.error('Failed to send email "%s" to %s.' % (
+                                                    msg.subject, msg.to[0]))
+                logger.exception(e)
+                close_quietly(connection)
+    finally:
+        close_quietly(connection)
+
+
+def close_quietly(connection):
+    "Closes the email connection, logging rather than raising any error."
+    try:
+        connection.close()
+    except Exception as e:
+        logger.exception(e)
+
+
+def get_email_connection():
+    """Returns the connection to send emails with.  If the notification
+    outbox is active, this writes the emails to the outbox instead.
+    """
+    if getattr(settings, 'NOTIFICATION_OUTBOX_ACTIVE', False):
+        return get_connection('apps.notification.outbox.OutboxEmailBackend')
+    return get_connection()
+
+
+def build_message(to, subject, template_name, context, from_email=None):
+    """Returns an EmailMultiAlternatives for the supplied arguments,
+    which are as for send_mail().
+    """
     # Make to a list, if it isn't already
     if not isinstance(to, (list, tuple)):
         to = [to]
@@ -31,20 +144,14 @@ def send_mail(to, subject, template_name, context, from_email=None):
 
     content = {}
     for content_format in ('txt', 'html'):
-        content[content_format] = render_to_string('%s.%s' % (template_name,
-                                                              content_format),
-                                                   context)
+        content[content_format] = get_email_template('%s.%s' % (
+                        template_name, content_format)).render(Context(context))
     msg = EmailMultiAlternatives(subject,
                                  content['txt'],
                                  settings.DEFAULT_FROM_EMAIL,
                                  to)
     msg.attach_alternative(content['html'], "text/html")
-    try:
-        msg.send()
-    except SMTPRecipientsRefused:
-        # This happens if the domain isn't recognised - we don't
-        # want an exception here
-        logger.error('Failed to send email "%s" to %s.' % (subject, to[0]))
+    return msg
 
 
 # def render_model_for_email(instance, suffix):
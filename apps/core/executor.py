@@ -0,0 +1,82 @@
+"""Runs network-bound delivery work (emails, SMS messages, push notifications)
+concurrently, in a bounded pool of threads.
+
+The number of threads for each channel is set by the DELIVERY_CONCURRENCY
+setting, e.g. {'email': 4, 'sms': 2, 'push': 8}.  Channels that aren't
+listed are delivered in the calling thread.
+
+Usage:
+
+    def deliver(messages):
+        connection = get_connection()
+        for message in messages:
+            connection.send(message)
+        connection.close()
+
+    run_concurrently('email', messages, deliver)
+
+Each thread calls deliver once, with an iterator of the messages that
+thread takes, so it can reuse one connection for all of them.
+"""
+import Queue
+import threading
+from django.conf import settings
+from django.db import connection
+import logging
+
+logger = logging.getLogger('project')
+
+
+def get_concurrency(channel):
+    "Returns the most threads to deliver the channel with."
+    return max(getattr(settings, 'DELIVERY_CONCURRENCY', {}).get(channel, 1),
+               1)
+
+
+def run_concurrently(channel, items, deliver):
+    """Calls deliver in up to the channel's concurrency of threads, sharing
+    out the supplied items between them, and waits for them all to finish.
+
+    If deliver raises an exception in any thread, the other threads carry
+    on with the remaining items; the first exception is then raised
+    in the calling thread.
+    """
+    items = list(items)
+    number_of_threads = min(get_concurrency(channel), len(items))
+    if number_of_threads <= 1:
+        deliver(iter(items))
+        return
+
+    queue = Queue.Queue()
+    for item in items:
+        queue.put(item)
+
+    def take():
+        # Yields items until the queue is empty
+        while True:
+            try:
+                yield queue.get_nowait()
+            except Queue.Empty:
+                return
+
+    errors = []
+    def work():
+        try:
+            deliver(take())
+        except Exception as e:
+            logger.exception(e)
+            errors.append(e)
+        finally:
+            # In case deliver used the database; each thread has its own
+            # connection, which would otherwise be left open
+            connection.close()
+
+    threads = [threading.Thread(target=work)
+               for i in range(number_of_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
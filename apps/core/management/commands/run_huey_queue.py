@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import CommandError
+from huey.bin.huey_consumer import get_loglevel, setup_logger
+from huey.consumer import Consumer
+from huey.djhuey.management.commands.run_huey import Command as RunHueyCommand
+from apps.core.queues import get_queue
+
+
+class Command(RunHueyCommand):
+    """Runs the consumer for one of the additional queues in HUEY_QUEUES
+    (see apps.core.queues).  Example usage::
+
+        python manage.py run_huey_queue reminders
+    """
+    args = '<queue name>'
+    help = 'Run the consumer for one of the HUEY_QUEUES'
+
+    def handle(self, *args, **options):
+        queues = getattr(settings, 'HUEY_QUEUES', {})
+        if len(args) != 1 or args[0] not in queues:
+            raise CommandError('Please specify one of the HUEY_QUEUES: %s.' \
+                                                    % ', '.join(queues))
+        queue_name = args[0]
+
+        consumer_options = dict(queues[queue_name])
+        # Periodic tasks are enqueued by the default consumer
+        consumer_options['periodic'] = False
+        for option in ('workers', 'initial_delay', 'max_delay'):
+            if options[option] is not None:
+                consumer_options[option] = options[option]
+
+        self.autodiscover()
+
+        loglevel = get_loglevel(consumer_options.pop('loglevel', None))
+        logfile = consumer_options.pop('logfile', None)
+        setup_logger(loglevel, logfile)
+
+        consumer = Consumer(get_queue(queue_name), **consumer_options)
+        consumer.run()
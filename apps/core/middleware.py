@@ -1,7 +1,19 @@
 from django.contrib.auth import logout
+from . import roles
 
 class StrictAuthenticationMiddleware(object):
     """Logs out users who are inactive."""
     def process_view(self, request, view_func, view_args, view_kwargs):
         if request.user.is_authenticated() and not request.user.is_active:
                 logout(request)
+
+
+class RoleMiddleware(object):
+    """Caches the roles and profiles of users (see apps.core.roles)
+    for the duration of each request."""
+    def process_request(self, request):
+        roles.start_request()
+
+    def process_response(self, request, response):
+        roles.end_request()
+        return response
@@ -0,0 +1,63 @@
+"""Additional Huey queues, so latency-sensitive tasks (such as reminders)
+don't wait behind bulk work (such as inviting freelancers) on the
+default queue.
+
+The queues are configured by the HUEY_QUEUES setting, keyed by name, with
+the options for each queue's consumer:
+
+    HUEY_QUEUES = {
+        'reminders': {'workers': 2},
+    }
+
+Each queue is stored under its own name on the same backend as the default
+queue, and needs its own consumer:
+
+    python manage.py run_huey_queue reminders
+
+Periodic tasks are only enqueued by the default consumer (run_huey).
+
+Usage:
+
+    @queue_db_task('reminders')
+    def send_reminders(reminder_set):
+        ...
+
+If the named queue isn't configured, the task goes on the default queue.
+"""
+from django.conf import settings
+from huey import Huey
+from huey.djhuey import HUEY, close_db
+from huey.utils import load_class
+
+
+# The Huey instances for the additional queues, keyed by queue name
+_queues = {}
+
+
+def get_queue(queue_name):
+    """Returns the Huey instance for the queue with the supplied name,
+    or the default Huey instance if the queue isn't configured.
+    """
+    if queue_name not in getattr(settings, 'HUEY_QUEUES', {}):
+        return HUEY
+    if queue_name not in _queues:
+        Queue, DataStore, Schedule, Events = load_class(
+                                    settings.HUEY['backend'] + '.Components')
+        name = '%s-%s' % (settings.HUEY['name'], queue_name)
+        conn = settings.HUEY.get('connection', {})
+        _queues[queue_name] = Huey(
+            Queue(name, **conn),
+            DataStore and DataStore(name, **conn) or None,
+            Schedule and Schedule(name, **conn) or None,
+            Events and Events(name, **conn) or None,
+            always_eager=settings.HUEY.get('always_eager', False))
+    return _queues[queue_name]
+
+
+def queue_db_task(queue_name, *args, **kwargs):
+    """Decorator for tasks that may operate on the database, like
+    huey.djhuey.db_task, but which puts the task on the named queue.
+    """
+    def decorator(fn):
+        return get_queue(queue_name).task(*args, **kwargs)(close_db(fn))
+    return decorator
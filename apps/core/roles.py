@@ -0,0 +1,128 @@
+"""Resolves which roles a user has (freelancer, client, driver, site admin),
+and their profiles, without querying the database each time.
+
+Each role is registered by the app that defines it, with a function that
+looks up a cacheable value for the user, such as the id of their profile
+(or None):
+
+    @roles.register('client')
+    def get_client_id(user):
+        ...
+
+A user's roles are then all looked up together, and cached (in the default
+cache, for ROLE_CACHE_TIMEOUT seconds) and for the rest of the request:
+
+    roles.get_roles(user)['client']
+
+Roles that grant extra rights, and so mustn't outlive a change (such as
+site admin), should be registered with shared=False; they are then only
+cached for the rest of the request.
+
+The per-request cache is kept by RoleMiddleware; outside of requests
+(e.g. in tasks) only the shared cache is used.  Apps should call
+invalidate_roles with the ids of any users whose roles may have changed.
+"""
+import threading
+from django.conf import settings
+from django.core.cache import cache
+
+
+# The functions that look up each role, keyed by role name
+_loaders = {}
+# The names of the roles that aren't kept in the shared cache
+_unshared = set()
+
+# The roles and profiles looked up during the current request
+_local = threading.local()
+
+
+def register(name, shared=True):
+    """Decorator that registers a function to look up the named role.
+    Unless shared is True, the role is only cached for the rest of
+    the request.
+    """
+    def decorator(fn):
+        _loaders[name] = fn
+        if not shared:
+            _unshared.add(name)
+        return fn
+    return decorator
+
+
+def start_request():
+    "Starts caching roles and profiles for the current request."
+    _local.roles = {}
+    _local.profiles = {}
+
+
+def end_request():
+    "Stops caching roles and profiles for the current request."
+    _local.roles = None
+    _local.profiles = None
+
+
+def get_cache_key(user_id):
+    return 'roles:%d' % user_id
+
+
+def get_roles(user):
+    """Returns a dictionary of the values registered for each role,
+    for the supplied user, keyed by role name.
+    """
+    if user.pk is None:
+        return load_roles(user)
+
+    request_roles = getattr(_local, 'roles', None)
+    if request_roles is not None and user.pk in request_roles:
+        return request_roles[user.pk]
+
+    shared_names = set(_loaders) - _unshared
+    key = get_cache_key(user.pk)
+    roles = cache.get(key)
+    if roles is None or set(roles) != shared_names:
+        roles = load_roles(user, shared_names)
+        cache.set(key, roles, settings.ROLE_CACHE_TIMEOUT)
+    roles = dict(roles, **load_roles(user, _unshared))
+
+    if request_roles is not None:
+        request_roles[user.pk] = roles
+    return roles
+
+
+def load_roles(user, names=None):
+    """Looks up the value for each role (or just the named ones) for
+    the user, from the database.
+    """
+    if names is None:
+        names = _loaders.keys()
+    return dict((name, _loaders[name](user)) for name in names)
+
+
+def get_profile(user, name, load):
+    """Returns the user's profile for the named role, calling load to
+    get it the first time it's needed in the request.
+    """
+    request_profiles = getattr(_local, 'profiles', None)
+    if request_profiles is None or user.pk is None:
+        return load()
+    if (user.pk, name) not in request_profiles:
+        request_profiles[(user.pk, name)] = load()
+    return request_profiles[(user.pk, name)]
+
+
+def invalidate_roles(user_ids):
+    "Clears the cached roles and profiles for the supplied users."
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    cache.delete_many([get_cache_key(user_id) for user_id in user_ids])
+
+    request_roles = getattr(_local, 'roles', None)
+    if request_roles is not None:
+        for user_id in user_ids:
+            request_roles.pop(user_id, None)
+    request_profiles = getattr(_local, 'profiles', None)
+    if request_profiles is not None:
+        for user_id, name in request_profiles.keys():
+            if user_id in user_ids:
+                del request_profiles[(user_id, name)]
@@ -132,8 +132,8 @@ def summary(context, instance):
                                              'request': context['request']})
 
 
-@register.simple_tag
-def summary_for_email(instance, audience):
+@register.simple_tag(takes_context=True)
+def summary_for_email(context, instance, audience):
     """Outputs a summary of the supplied model instance, suitable for email,
     for the appropriate audience ('freelancer', 'client', 'admin').
     
@@ -144,8 +144,22 @@ def summary_for_email(instance, audience):
         This will pass the supplied driver job request to
         'driver/email/includes/driverjobrequest_client_summary.html', falling
         back to 'job/email/includes/jobrequest_client_summary.html'.
+
+    If the context contains an email_fragment_cache dictionary, the summary
+    is only rendered once per instance and audience for everything sharing
+    that dictionary (for example, a batch of emails about the same job).
     """
+    fragment_cache = context.get('email_fragment_cache')
+    if fragment_cache is None:
+        return _render_summary_for_email(instance, audience)
+    key = ('summary_for_email', instance.__class__, instance.pk, audience)
+    if key not in fragment_cache:
+        fragment_cache[key] = _render_summary_for_email(instance, audience)
+    return fragment_cache[key]
+
 
+def _render_summary_for_email(instance, audience):
+    "Renders the summary for summary_for_email."
     template_names = template_names_from_polymorphic_model(instance.__class__,
                                             suffix='_%s_summary' % audience,
                                             subdirectory='email/includes')
@@ -1,5 +1,6 @@
 from class_registry import Registry
 from collections import OrderedDict
+import errno, httplib, socket
 
 
 class WeightedRegistry(Registry):
@@ -65,3 +66,124 @@ def template_names_from_polymorphic_model(model_class, suffix,
             ),
         )
     return template_names
+
+
+def exclude_from_full_save(instance, field_names, save_kwargs):
+    """Returns the keyword arguments for saving an existing model instance,
+    changed so that a full save leaves the named fields alone; for fields
+    that are kept up to date by queries of their own, and so would be
+    overwritten with stale values.
+
+    Saves that create the instance, or that name their update_fields,
+    are left alone.
+    """
+    if instance._state.adding or save_kwargs.get('force_insert') or \
+                            save_kwargs.get('update_fields') is not None:
+        return save_kwargs
+    return dict(save_kwargs, update_fields=[
+                    field.name for field in instance._meta.concrete_fields
+                    if not field.primary_key and
+                        field.name not in field_names])
+
+
+def is_stale_connection_error(error):
+    """Returns whether the error, raised by a request over a reused,
+    kept-alive httplib connection, means the other end had already closed
+    the connection, so the request can't have been handled and is safe to
+    send again on a new connection.
+
+    Timeouts never are, as the other end may have handled the request.
+    """
+    if isinstance(error, socket.timeout):
+        return False
+    if isinstance(error, httplib.BadStatusLine):
+        # Raised with an empty status line when the connection was closed
+        return error.line in ('', repr(''))
+    return isinstance(error, socket.error) and \
+                            error.errno in (errno.ECONNRESET, errno.EPIPE)
+
+
+class OutcomeUnknown(Exception):
+    """Raised by KeepAliveConnection when a request was sent, but the
+    response couldn't be read (e.g. it timed out), so the other end may or
+    may not have handled it.  Requests that aren't idempotent (such as
+    sending an SMS or a push) shouldn't be retried after this.
+    """
+    pass
+
+
+class KeepAliveConnection(object):
+    """A kept-alive HTTPS connection to a single host, for making many
+    requests without reconnecting each time.
+
+        connection = KeepAliveConnection('api.example.com')
+        status, body = connection.post('/endpoint', data, headers)
+
+    If the other end has closed the connection since the last request,
+    it reconnects and sends the request once more.  Other failures aren't
+    retried: errors before the response are raised as they are, and errors
+    reading the response are raised as OutcomeUnknown.
+
+    httplib connections can't be shared between threads, so each thread
+    should have its own.
+    """
+    def __init__(self, host, port=443, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.connection = None
+        # Whether a request has already been made over the connection
+        self.connection_used = False
+
+    def connect(self):
+        "Opens a new connection."
+        self.close()
+        self.connection = httplib.HTTPSConnection(self.host, self.port,
+                                                  timeout=self.timeout)
+        self.connection.connect()
+        self.connection_used = False
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    def post(self, path, body, headers):
+        "Posts the body, returning the response status and body."
+        reused = self.connection is not None and self.connection_used
+        try:
+            return self.request('POST', path, body, headers)
+        except (httplib.HTTPException, socket.error) as e:
+            if not (reused and is_stale_connection_error(e)):
+                raise
+            return self.request('POST', path, body, headers)
+
+    def request(self, method, path, body, headers):
+        """Makes the request, returning the response status and body.
+        The response is always read, so the connection can be reused.
+
+        Errors reading the response are raised as OutcomeUnknown, unless
+        they show that a reused connection had already been closed (see
+        is_stale_connection_error), in which case the request wasn't handled.
+        """
+        if not self.connection:
+            self.connect()
+        reused = self.connection_used
+        headers = dict(headers, Connection='keep-alive')
+        try:
+            self.connection.request(method, path, body, headers)
+        except:
+            # The connection is in an unknown state, so don't reuse it
+            self.close()
+            raise
+        try:
+            response = self.connection.getresponse()
+            result = response.status, response.read()
+        except Exception as e:
+            self.close()
+            if reused and is_stale_connection_error(e):
+                raise
+            raise OutcomeUnknown('Could not read the response from %s: %r'
+                                 % (self.host, e))
+        self.connection_used = True
+        return result
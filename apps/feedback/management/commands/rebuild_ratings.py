@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from apps.feedback.models import FreelancerRating
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the rating summaries for all freelancers from ' \
+           'their feedback.'
+
+    def handle(self, *args, **options):
+        count = FreelancerRating.objects.rebuild_all()
+        self.stdout.write('Rebuilt ratings for %d freelancers.' % count)
@@ -1,19 +1,20 @@
 from django.shortcuts import redirect
 from django.contrib import messages
-from .models import get_job_requests_awaiting_feedback_for_client
+from apps.core.badges import get_badge_counts
 
 
 class FeedbackMiddleware(object):
      """Feedback-related middleware.
      """
      def process_view(self, request, view_func, view_args, view_kwargs):
-        if request.user.is_authenticated() and request.user.is_client:
-            # If they're booking a freelancer, make sure they have cleared their
-            # feedback backlog first.
-            if view_func.func_name == 'JobRequestCreate':
-                if get_job_requests_awaiting_feedback_for_client(
-                                                request.user.client).exists():
-                    messages.warning(request,
-                        'Before you book another freelancer, please leave '
-                        'feedback on these jobs.')
-                    return redirect('client_backlog')
+        # If they're booking a freelancer, make sure they have cleared their
+        # feedback backlog first.  The view is checked first, so other
+        # requests don't need to look anything up.
+        if view_func.func_name == 'JobRequestCreate' and \
+                                        request.user.is_authenticated():
+            # Uses the cached backlog count, which is 0 for non-clients
+            if get_badge_counts(request)['client_backlog']:
+                messages.warning(request,
+                    'Before you book another freelancer, please leave '
+                    'feedback on these jobs.')
+                return redirect('client_backlog')
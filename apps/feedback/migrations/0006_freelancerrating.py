@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def build_ratings(apps, schema_editor):
+    "Builds the ratings for all freelancers from their client feedback."
+    BookingFeedback = apps.get_model('feedback', 'BookingFeedback')
+    FreelancerRating = apps.get_model('feedback', 'FreelancerRating')
+    Freelancer = apps.get_model('freelancer', 'Freelancer')
+
+    ratings = dict((freelancer_id, FreelancerRating(freelancer_id=freelancer_id))
+                   for freelancer_id in Freelancer.objects.values_list('pk',
+                                                                    flat=True))
+    recent_scores = {}
+    for freelancer_id, score in BookingFeedback.objects.filter(
+                    author_type='CL').order_by('booking__freelancer',
+                    '-date').values_list('booking__freelancer', 'score'):
+        rating = ratings[freelancer_id]
+        rating.count += 1
+        rating.total += score
+        scores = recent_scores.setdefault(freelancer_id, [])
+        if len(scores) < 5:
+            scores.append(score)
+    for freelancer_id, scores in recent_scores.items():
+        ratings[freelancer_id].recent_scores = ','.join(str(score)
+                                                        for score in scores)
+    FreelancerRating.objects.bulk_create(ratings.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('freelancer', '0021_freelancer_availability_mask'),
+        ('feedback', '0005_auto_20150528_1717'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FreelancerRating',
+            fields=[
+                ('freelancer', models.OneToOneField(related_name='rating_summary', primary_key=True, serialize=False, to='freelancer.Freelancer')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('recent_scores', models.CommaSeparatedIntegerField(max_length=50, blank=True)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.RunPython(build_ratings),
+    ]
@@ -3,42 +3,32 @@ from django.core import validators
 from apps.job.models import JobRequest
 from apps.booking.models import Booking
 from apps.freelancer.models import Freelancer
-from django.db.models import Avg
+from apps.core import badges
+from django.db.models import Count, Sum
+from django.db import transaction
 
 
 def _average_score(self):
     """Returns the average score for the Freelancer.
      The algorithm should be all ratings for that driver,
      but with the 5 most recent given double weighting, to one decimal point.
-    """
-    # Specify the querysets - giving double weighting to the most
-    # recent five feedbacks
-    feedback = BookingFeedback.objects.feedback_for_freelancer(self).order_by(
-                                                                    '-date')
-    weighted_feedback = (
-        (feedback[:5], 2),
-        (feedback[5:], 1),
-    )
-
-    # Assemble a list of averages which we will then average.  This allows
-    # us to 'weight' certain querysets by including them multiple times in
-    # the averages list.
-    averages = [5]
-    for feedbacks, weighting in weighted_feedback:
-        average = feedbacks.aggregate(Avg('score')).values()[0]
-        # Add the average as many times as the weighting specifies
-        # (not adding it if it's None)
-        [averages.append(average) for i in range(weighting) if average != None]
 
-    if not averages:
-        return None
-
-    return round(sum(averages) / len(averages), 1)
+    The score is calculated from the freelancer's FreelancerRating, so
+    doesn't need to query the feedback itself.
+    """
+    return FreelancerRating.objects.get_for_freelancer(self
+                                                       ).get_average_score()
 
 def _reviews(self, limit=20):
-  feedback = BookingFeedback.objects.feedback_for_freelancer(self).order_by('-date')
-  # TODO: Look at BookingFeedback Serializer
-  return feedback[:limit] 
+    """Returns the most recent client feedback for the freelancer, newest
+    first.  Uses the reviews loaded by BookingFeedback.objects.prefetch_reviews,
+    if any.
+    """
+    if hasattr(self, '_prefetched_reviews'):
+        return self._prefetched_reviews[:limit]
+    feedback = BookingFeedback.objects.feedback_for_freelancer(self).order_by(
+                                                                '-date', '-id')
+    return feedback[:limit]
 
 Freelancer.average_score = _average_score
 Freelancer.reviews = _reviews
@@ -116,6 +106,40 @@ class BookingFeedbackManager(models.Manager):
         return self.filter(author_type=BookingFeedback.AUTHOR_TYPE_CLIENT,
                            booking__freelancer=freelancer)
 
+    def prefetch_reviews(self, freelancers, limit):
+        """Loads the limit most recent client feedbacks for each of the
+        supplied freelancers, in a single query, so that calling
+        freelancer.reviews() doesn't need to query the database.
+        """
+        reviews = dict((freelancer.pk, []) for freelancer in freelancers)
+        if reviews and limit > 0:
+            # Number each freelancer's feedback, newest first, and only
+            # return the first few for each
+            for feedback in self.raw("""
+                SELECT * FROM (
+                    SELECT review_feedback.*,
+                        review_booking."freelancer_id" AS "review_freelancer_id",
+                        ROW_NUMBER() OVER (
+                            PARTITION BY review_booking."freelancer_id"
+                            ORDER BY review_feedback."date" DESC,
+                                     review_feedback."id" DESC
+                        ) AS "review_rank"
+                    FROM "%(feedback_table)s" review_feedback
+                    INNER JOIN "%(booking_table)s" review_booking
+                        ON review_booking."id" = review_feedback."booking_id"
+                    WHERE review_feedback."author_type" = %%s
+                    AND review_booking."freelancer_id" = ANY(%%s)
+                ) ranked_feedback
+                WHERE "review_rank" <= %%s
+                ORDER BY "review_freelancer_id", "review_rank"
+            """ % {'feedback_table': self.model._meta.db_table,
+                   'booking_table': Booking._meta.db_table},
+                    [BookingFeedback.AUTHOR_TYPE_CLIENT, reviews.keys(),
+                     limit]):
+                reviews[feedback.review_freelancer_id].append(feedback)
+        for freelancer in freelancers:
+            freelancer._prefetched_reviews = reviews[freelancer.pk]
+
     def feedback_by_freelancer(self, freelancer):
         """Returns all the feedback by a particular freelancer.
         """
@@ -184,6 +208,152 @@ class BookingFeedback(models.Model):
                                     self.get_author())
 
 
+class FreelancerRatingManager(models.Manager):
+    "Model manager for FreelancerRatings."
+
+    def get_for_freelancer(self, freelancer):
+        """Returns the FreelancerRating for the freelancer, building it
+        if it doesn't exist yet.
+        """
+        try:
+            return freelancer.rating_summary
+        except FreelancerRating.DoesNotExist:
+            return self.rebuild(freelancer.pk)
+
+    def add_feedback(self, feedback):
+        """Updates the freelancer's rating to include the supplied
+        feedback, which should be their most recent.
+        """
+        freelancer_id = feedback.booking.freelancer_id
+        with transaction.atomic():
+            try:
+                # Lock the rating, so concurrent feedback isn't lost
+                rating = self.select_for_update().get(
+                                                freelancer_id=freelancer_id)
+            except FreelancerRating.DoesNotExist:
+                # Building it from scratch will include the new feedback
+                return self.rebuild(freelancer_id)
+            rating.count += 1
+            rating.total += feedback.score
+            rating.set_recent_scores([feedback.score] +
+                                     rating.get_recent_scores())
+            rating.save()
+        return rating
+
+    def rebuild(self, freelancer_id, create=True):
+        """Builds the FreelancerRating for the freelancer with the supplied
+        id from their feedback, and returns it.
+
+        Pass create=False to only update an existing rating (for example,
+        while the freelancer may be being deleted).
+        """
+        feedback = BookingFeedback.objects.filter(
+                        author_type=BookingFeedback.AUTHOR_TYPE_CLIENT,
+                        booking__freelancer_id=freelancer_id)
+        totals = feedback.aggregate(count=Count('id'), total=Sum('score'))
+        rating = FreelancerRating(freelancer_id=freelancer_id,
+                                  count=totals['count'],
+                                  total=totals['total'] or 0)
+        rating.set_recent_scores(list(feedback.order_by('-date').values_list(
+                    'score', flat=True)[:FreelancerRating.RECENT_WINDOW]))
+        if create:
+            rating.save()
+        else:
+            self.filter(freelancer_id=freelancer_id).update(
+                                        count=rating.count, total=rating.total,
+                                        recent_scores=rating.recent_scores)
+        return rating
+
+    def rebuild_all(self):
+        """Rebuilds the ratings for all freelancers, in a handful of
+        queries.  Returns the number of ratings built.
+        """
+        ratings = dict((freelancer_id, FreelancerRating(
+                                freelancer_id=freelancer_id, count=count,
+                                total=total))
+            for freelancer_id, count, total in BookingFeedback.objects.filter(
+                        author_type=BookingFeedback.AUTHOR_TYPE_CLIENT
+                    ).values('booking__freelancer').annotate(
+                        count=Count('id'), total=Sum('score')
+                    ).order_by().values_list('booking__freelancer',
+                                             'count', 'total'))
+
+        recent_scores = {}
+        for freelancer_id, score in BookingFeedback.objects.filter(
+                        author_type=BookingFeedback.AUTHOR_TYPE_CLIENT
+                    ).order_by('booking__freelancer', '-date').values_list(
+                        'booking__freelancer', 'score'):
+            scores = recent_scores.setdefault(freelancer_id, [])
+            if len(scores) < FreelancerRating.RECENT_WINDOW:
+                scores.append(score)
+        for freelancer_id, scores in recent_scores.items():
+            ratings[freelancer_id].set_recent_scores(scores)
+
+        # Freelancers without feedback get an empty rating, so it doesn't
+        # need building when it's first used
+        for freelancer_id in Freelancer.objects.exclude(
+                        pk__in=ratings.keys()).values_list('pk', flat=True):
+            ratings[freelancer_id] = FreelancerRating(
+                                                freelancer_id=freelancer_id)
+
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(ratings.values())
+        return len(ratings)
+
+
+class FreelancerRating(models.Model):
+    """A summary of the feedback clients have given a freelancer, kept up to
+    date as feedback is left, so their average score can be calculated
+    without querying the feedback.  See Freelancer.average_score().
+
+    It can be rebuilt from the feedback with the rebuild_ratings
+    management command.
+    """
+    # How many of the most recent scores are weighted more heavily
+    RECENT_WINDOW = 5
+
+    freelancer = models.OneToOneField(Freelancer, primary_key=True,
+                                      related_name='rating_summary')
+    # The number and sum of all the scores
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    # The RECENT_WINDOW most recent scores, newest first
+    recent_scores = models.CommaSeparatedIntegerField(max_length=50,
+                                                      blank=True)
+
+    objects = FreelancerRatingManager()
+
+    def get_recent_scores(self):
+        return [int(score) for score in self.recent_scores.split(',')
+                if score]
+
+    def set_recent_scores(self, scores):
+        self.recent_scores = ','.join(str(score) for score in
+                                      scores[:self.RECENT_WINDOW])
+
+    def get_average_score(self):
+        """Returns the average score, giving the most recent scores double
+        weighting, to one decimal point.
+        """
+        recent_scores = self.get_recent_scores()
+        other_count = self.count - len(recent_scores)
+
+        # Assemble a list of averages which we will then average, including
+        # the recent average twice to give it double weighting
+        averages = [5]
+        if recent_scores:
+            averages.extend([float(sum(recent_scores)) /
+                                                    len(recent_scores)] * 2)
+        if other_count > 0:
+            averages.append(float(self.total - sum(recent_scores)) /
+                                                                other_count)
+        return round(sum(averages) / len(averages), 1)
+
+    def __unicode__(self):
+        return 'Rating for %s' % self.freelancer
+
+
 def _needs_feedback_from_client(self):
     """Returns whether or not the JobRequest needs any feedback from client.
     """
@@ -241,7 +411,19 @@ def get_job_requests_awaiting_feedback_for_client(client):
     - for the supplied client;
     - where the supplied client still needs to provide feedback.
     """
-    # Get job request pks for the client's job requests that still need feedback
-    jobs_needing_feedback = set(get_bookings_awaiting_feedback_for_client(
-                            client).values_list('jobrequest_id', flat=True))
+    # Filter by the client's job requests that still need feedback,
+    # as a subquery, so the bookings aren't fetched
+    jobs_needing_feedback = get_bookings_awaiting_feedback_for_client(
+                                            client).values('jobrequest_id')
     return JobRequest.objects.filter(pk__in=jobs_needing_feedback)
+
+
+@badges.register('freelancer_backlog', role='freelancer')
+def count_bookings_awaiting_feedback_for_freelancer(user):
+    return get_bookings_awaiting_feedback_for_freelancer(
+                                                    user.freelancer).count()
+
+
+@badges.register('client_backlog', role='client')
+def count_job_requests_awaiting_feedback_for_client(user):
+    return get_job_requests_awaiting_feedback_for_client(user.client).count()
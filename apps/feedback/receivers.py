@@ -1,10 +1,14 @@
 from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
 from apps.core.email import send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
 from apps.job.models import JobRequest
 from django_fsm.signals import post_transition
 from apps.notification.models import Notification
+from apps.booking.models import Booking
+from apps.core.badges import invalidate_badge_counts
+from .models import BookingFeedback, FreelancerRating
 
 
 @receiver(post_transition)
@@ -59,3 +63,37 @@ def prompt_client_and_drivers_for_feedback(sender, instance, name,
 #                 category='freelancer_feedback_request',
 #                 related_object=instance,
 #                 user=booking.freelancer.user)
+
+
+@receiver(post_save, sender=BookingFeedback)
+def update_freelancer_rating_on_feedback_saved(sender, instance, created,
+                                               **kwargs):
+    "Keeps the freelancer's rating up to date when a client leaves feedback."
+    if instance.author_type == BookingFeedback.AUTHOR_TYPE_CLIENT:
+        if created:
+            FreelancerRating.objects.add_feedback(instance)
+        else:
+            # The score may have changed, so start again
+            FreelancerRating.objects.rebuild(instance.booking.freelancer_id)
+
+
+@receiver(post_delete, sender=BookingFeedback)
+def update_freelancer_rating_on_feedback_deleted(sender, instance, **kwargs):
+    "Keeps the freelancer's rating up to date when feedback is deleted."
+    if instance.author_type == BookingFeedback.AUTHOR_TYPE_CLIENT:
+        # The booking (or even the freelancer) may be being deleted too,
+        # so look up the freelancer without loading it, and don't create
+        # a rating for them
+        for freelancer_id in Booking.objects.filter(pk=instance.booking_id
+                                ).values_list('freelancer_id', flat=True):
+            FreelancerRating.objects.rebuild(freelancer_id, create=False)
+
+
+@receiver([post_save, post_delete], sender=BookingFeedback)
+def invalidate_badge_counts_on_feedback_changed(sender, instance, **kwargs):
+    "Clears the feedback backlog counts of the client and freelancer."
+    invalidate_badge_counts(user_id for values in Booking.objects.filter(
+                                pk=instance.booking_id).values_list(
+                                    'freelancer__user_id',
+                                    'jobrequest__client__user_id')
+                            for user_id in values)
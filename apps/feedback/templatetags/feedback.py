@@ -1,8 +1,7 @@
 from django import template
 from apps.job.models import JobRequest
-from ..models import BookingFeedback, \
-    get_bookings_awaiting_feedback_for_freelancer, \
-    get_job_requests_awaiting_feedback_for_client
+from ..models import BookingFeedback
+from apps.core.badges import get_badge_counts
 from django.conf import settings
 from apps.main.templatetags.icons import icon
 from django.contrib.admin.templatetags.admin_list import items_for_result
@@ -186,16 +185,12 @@ def feedback_icon(unit, for_email=False):
 
 @register.assignment_tag(takes_context=True)
 def freelancer_backlog_count(context):
-    # TODO - this would be a good candidate for caching
-    return get_bookings_awaiting_feedback_for_freelancer(
-                                    context['request'].user.freelancer).count()
+    return get_badge_counts(context['request'])['freelancer_backlog']
 
 
 @register.assignment_tag(takes_context=True)
 def client_backlog_count(context):
-    # TODO - this would be a good candidate for caching
-    return get_job_requests_awaiting_feedback_for_client(
-                                    context['request'].user.client).count()
+    return get_badge_counts(context['request'])['client_backlog']
 
 @register.simple_tag
 def booking_feedback_summary(booking):
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('freelancer', '0020_freelancer_last_applied'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='freelancer',
+            name='availability_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+            preserve_default=True,
+        ),
+    ]
@@ -4,6 +4,7 @@ from django.core.urlresolvers import reverse
 from django.contrib.auth.models import User
 from polymorphic import PolymorphicModel
 from apps.core.models import GeoPolymorphicManager
+from apps.core.utils import exclude_from_full_save
 from django.conf import settings
 from datetime import date
 from django.core import validators
@@ -15,6 +16,7 @@ from django.template.defaultfilters import pluralize
 from apps.core.views import POUND_SIGN
 from apps.location.models import Postcode
 from apps.core.validators import mobile_validator
+from apps.core import roles
 import calendar
 
 
@@ -23,7 +25,7 @@ def _is_freelancer(self):
     Returns whether or not the user account is a freelancer account,
     i.e. has a freelancer profile.
     ."""
-    return Freelancer.objects.filter(user=self).exists()
+    return roles.get_roles(self)['freelancer'] is not None
 User.is_freelancer = property(_is_freelancer)
 
 
@@ -32,10 +34,21 @@ def _freelancer(self):
     Returns the Freelancer for the user.  If it doesn't, raises
     Freelancer.DoesNotExist.
     """
-    return self.freelancer_set.get()
+    freelancer_id = roles.get_roles(self)['freelancer']
+    if freelancer_id is None:
+        raise Freelancer.DoesNotExist
+    return roles.get_profile(self, 'freelancer',
+                    lambda: Freelancer.objects.get(pk=freelancer_id))
 User.freelancer = property(_freelancer)
 
 
+@roles.register('freelancer')
+def get_freelancer_id(user):
+    "Returns the id of the user's freelancer profile, or None."
+    return Freelancer.objects.filter(user=user).values_list('pk',
+                                                            flat=True).first()
+
+
 def client_to_freelancer_rate(client_rate):
     """Given a client rate as a moneyed.Money object,
     return the freelancer rate, also as a Money object.
@@ -174,6 +187,17 @@ class Freelancer(PolymorphicModel):
                                 default=YEARS_EXPERIENCE_ONE,
                                 choices=YEARS_EXPERIENCE_CHOICES)
 
+    # Denormalized copy of the freelancer's availability, one bit per
+    # shift, so that job matching doesn't need to join onto the availability
+    # table.  This is kept in sync by apps.booking.models.Availability.
+    # Zero means no availability has been provided.
+    availability_mask = models.BigIntegerField(default=0, editable=False)
+
+    # Denormalized fields that are updated by queries of their own, so are
+    # left alone by full saves (which may hold stale values) unless named
+    # in update_fields
+    DENORMALIZED_FIELDS = ('availability_mask',)
+
     objects = GeoPolymorphicManager()
     published_objects = PublishedFreelancerManager()
 
@@ -184,6 +208,7 @@ class Freelancer(PolymorphicModel):
     def save(self, *args, **kwargs):
         if self.published == True:
             self.last_applied = date.today()
+        kwargs = exclude_from_full_save(self, self.DENORMALIZED_FIELDS, kwargs)
         super(Freelancer, self).save(*args, **kwargs)
 
 
@@ -192,11 +217,15 @@ class Freelancer(PolymorphicModel):
         "Returns a reference number for this freelancer."
         return 'FR%s' % str(self.pk).zfill(7)
 
+    # The number of days since last applying for which a freelancer
+    # counts as active
+    ACTIVE_DAYS = 14
+
     @property
     def is_active(self):
         delta = date.today() - self.last_applied
 
-        return (self.published and (delta.days <= 14))
+        return (self.published and (delta.days <= self.ACTIVE_DAYS))
 
 
     def get_full_name(self):
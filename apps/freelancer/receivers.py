@@ -1,9 +1,10 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from apps.core.email import send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
 from .models import Freelancer
+from apps.core.roles import invalidate_roles
 
 
 @receiver(post_save)
@@ -38,3 +39,10 @@ def welcome_freelancer_on_sign_up(sender, instance, created, **kwargs):
                   'email/base',
                   {'title': subject,
                    'content': content})
+
+
+@receiver([post_save, post_delete])
+def invalidate_roles_on_freelancer_changed(sender, instance, **kwargs):
+    "Makes sure the user's cached roles don't go stale."
+    if isinstance(instance, Freelancer):
+        invalidate_roles([instance.user_id])
@@ -239,6 +239,8 @@ class JobRequestUpdateMixin(object):
         job_request_changed.send(sender=self,
               instance=self.instance,
               changed_data=self.changed_data,
+              previous_data=dict((name, self.initial.get(name))
+                                 for name in self.changed_data),
               silent=(not self.cleaned_data['notify']))
 
         return instance
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('job', '0052_auto_20150818_1450'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrequest',
+            name='invitation_chain',
+            field=models.PositiveIntegerField(default=0, editable=False),
+            preserve_default=True,
+        ),
+    ]
@@ -15,6 +15,7 @@ from django_fsm import FSMField, transition
 from polymorphic import PolymorphicModel, PolymorphicQuerySet
 from apps.paygrade.models import YEARS_EXPERIENCE_CHOICES
 from apps.service import service_from_class
+from apps.core.utils import exclude_from_full_save
 
 
 class JobRequestQuerySet(PolymorphicQuerySet):
@@ -47,6 +48,57 @@ class JobRequestQuerySet(PolymorphicQuerySet):
         """
         return self.filter(status=JobRequest.STATUS_CONFIRMED).past()
 
+    def with_booking_stats(self):
+        """Annotates the job requests with the counts used by the booking
+        properties (is_full, number_of_invited_freelancers and so on), so
+        they don't each need a query per job request.  The counts are
+        added as booking_count, invitation_count and
+        undeclined_application_count.
+        """
+        # Imported here to avoid a circular import
+        from apps.booking.models import Booking, Invitation
+        table_names = {
+            'booking_table': Booking._meta.db_table,
+            'invitation_table': Invitation._meta.db_table,
+            'job_request_table': JobRequest._meta.db_table,
+        }
+        return self.extra(select={
+            'booking_count': """
+                SELECT COUNT(*) FROM "%(booking_table)s" stats_booking
+                WHERE stats_booking."jobrequest_id" = "%(job_request_table)s"."id"
+            """ % table_names,
+            'invitation_count': """
+                SELECT COUNT(*) FROM "%(invitation_table)s" stats_invitation
+                WHERE stats_invitation."jobrequest_id" = "%(job_request_table)s"."id"
+            """ % table_names,
+            'undeclined_application_count': """
+                SELECT COUNT(*) FROM "%(invitation_table)s" stats_invitation
+                WHERE stats_invitation."jobrequest_id" = "%(job_request_table)s"."id"
+                AND stats_invitation."date_applied" IS NOT NULL
+                AND stats_invitation."date_declined" IS NULL
+            """ % table_names,
+        })
+
+    def pending_confirmation(self):
+        """Filter by open job requests that have received enough
+        applications to be confirmed by staff.
+
+        The undeclined applications are counted in a subquery, so this is
+        a single query however many job requests are open.
+        """
+        # Imported here to avoid a circular import
+        from apps.booking.models import Invitation
+        return self.filter(status=JobRequest.STATUS_OPEN).extra(where=["""(
+            SELECT COUNT(*) FROM "%(invitation_table)s" pending_invitation
+            WHERE pending_invitation."jobrequest_id" = "%(job_request_table)s"."id"
+            AND pending_invitation."date_applied" IS NOT NULL
+            AND pending_invitation."date_declined" IS NULL
+        ) >= "%(job_request_table)s"."number_of_freelancers"
+        """ % {
+            'invitation_table': Invitation._meta.db_table,
+            'job_request_table': JobRequest._meta.db_table,
+        }])
+
 
 class JobRequest(PolymorphicModel):
     """A request by a client for a service for a particular
@@ -193,6 +245,11 @@ class JobRequest(PolymorphicModel):
     comments = models.TextField(
                     blank=True)
 
+    # Incremented each time freelancers start being invited, so that any
+    # earlier chain of invitation waves knows it has been superseded.
+    # See apps.booking.tasks.invite_matching_freelancers.
+    invitation_chain = models.PositiveIntegerField(default=0, editable=False)
+
     objects = JobRequestQuerySet.as_manager()
 
     def __unicode__(self):
@@ -268,6 +325,8 @@ class JobRequest(PolymorphicModel):
         # Now we have a correct timezone aware datetime, we need to convert it
         # to UTC (which is how it's stored in the database) before saving.
         self.end_datetime = local_end_datetime.astimezone(timezone.utc)
+        # The invitation chain is only changed by the invitation tasks
+        kwargs = exclude_from_full_save(self, ['invitation_chain'], kwargs)
         return super(JobRequest, self).save(*args, **kwargs)
 
     class Meta:
@@ -1,7 +1,10 @@
 import django.dispatch
 
 
-# Signal that is sent when a job is changed
+# Signal that is sent when a job is changed.
+# previous_data is a dictionary of the values of the changed fields
+# before the change was made.
 job_request_changed = django.dispatch.Signal(providing_args=['instance',
                                                              'changed_data',
+                                                             'previous_data',
                                                              'silent'])
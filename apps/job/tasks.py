@@ -1,4 +1,5 @@
 import time
+from django.db import transaction
 from huey.djhuey import crontab, db_periodic_task, db_task
 from .models import JobRequest
 
@@ -8,11 +9,23 @@ def complete_job_requests():
     """This task gets autodiscovered by the huey task queue.
     Every fifteen minutes, checks any open job requests to see if
     they need moving over to being complete.
+
+    Each job request is locked while it's completed, so this is safe to run
+    on more than one worker at once.
     """
     count = 0
-    for job_request in JobRequest.objects.need_completing():
-        job_request.complete()
-        job_request.save()
+    for job_request_id in JobRequest.objects.need_completing().values_list(
+                                                            'pk', flat=True):
+        with transaction.atomic():
+            # Lock the job request, skipping it if another worker has
+            # completed it in the meantime
+            try:
+                job_request = JobRequest.objects.select_for_update(
+                                    ).need_completing().get(pk=job_request_id)
+            except JobRequest.DoesNotExist:
+                continue
+            job_request.complete()
+            job_request.save()
         count += 1
     print('[%s] Automatically completed %d job requests.' % (time.ctime(),
                                                              count))
@@ -255,7 +255,8 @@ class RequestedJobList(ClientOnlyMixin, ContextMixin, TabsMixin, ListView):
     past = False
 
     def get_queryset(self, *args, **kwargs):
-        queryset = JobRequest.objects.for_client(self.client)
+        queryset = JobRequest.objects.for_client(self.client
+                                                 ).with_booking_stats()
         if self.past:
             return queryset.past()
         else:
@@ -388,5 +389,5 @@ class AdminJobList(AdminOnlyMixin, ContextMixin, TabsMixin, ListView):
         else:
             queryset = JobRequest.objects.filter(status=self.kwargs.get('status', JobRequest.STATUS_OPEN))
 
-        return queryset
+        return queryset.with_booking_stats()
 
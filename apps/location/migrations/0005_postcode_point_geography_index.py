@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+    """Adds a spatial index on the postcode point, cast to geography.
+    This allows ST_DWithin queries in metres (such as the travel distance
+    filter in job matching) to use an index.
+    """
+
+    dependencies = [
+        ('location', '0004_auto_20150417_0943'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX location_postcode_point_geography_id '
+            'ON location_postcode USING GIST ((point::geography));',
+            reverse_sql='DROP INDEX location_postcode_point_geography_id;',
+        ),
+    ]
@@ -1,7 +1,15 @@
 from django.contrib import admin
-from .models import Notification
+from .models import Notification, OutboxMessage
 
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ('user', 'category', 'message', 'datetime_created')
 
-admin.site.register(Notification, NotificationAdmin)
\ No newline at end of file
+admin.site.register(Notification, NotificationAdmin)
+
+
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('channel', 'status', 'attempts', 'datetime_created',
+                    'datetime_sent')
+    list_filter = ('channel', 'status')
+
+admin.site.register(OutboxMessage, OutboxMessageAdmin)
@@ -0,0 +1,37 @@
+import time
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from apps.notification.outbox import deliver_batch, database_supports_outbox
+
+
+class Command(BaseCommand):
+    help = 'Delivers the emails, SMS messages and push notifications ' \
+           'waiting in the notification outbox.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', default=100,
+                    help='How many messages to claim at a time.'),
+        make_option('--sleep', type='float', default=1,
+                    help='How many seconds to wait when the outbox is '
+                         'empty, before checking again.'),
+        make_option('--once', action='store_true', default=False,
+                    help='Exit once the outbox is empty, rather than '
+                         'waiting for more messages.'),
+    )
+
+    def handle(self, *args, **options):
+        if not database_supports_outbox():
+            raise CommandError('The outbox needs PostgreSQL 9.5 or later.')
+
+        total = 0
+        while True:
+            count = deliver_batch(options['batch_size'])
+            total += count
+            if count:
+                self.stdout.write('[%s] Delivered batch of %d outbox '
+                                  'messages.' % (time.ctime(), count))
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['sleep'])
+        self.stdout.write('Delivered %d outbox messages.' % total)
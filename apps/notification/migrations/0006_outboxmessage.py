@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0005_merge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('channel', models.CharField(max_length=2, choices=[('EM', 'Email'), ('SM', 'SMS'), ('PU', 'Push notification')])),
+                ('payload', models.TextField()),
+                ('status', models.CharField(default='PE', max_length=2, choices=[('PE', 'Pending'), ('SE', 'Sent'), ('FA', 'Failed')])),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('datetime_created', models.DateTimeField(auto_now_add=True)),
+                ('datetime_available', models.DateTimeField(default=django.utils.timezone.now)),
+                ('datetime_sent', models.DateTimeField(null=True, blank=True)),
+            ],
+            options={
+                'ordering': ('datetime_created',),
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterIndexTogether(
+            name='outboxmessage',
+            index_together=set([('status', 'datetime_available')]),
+        ),
+    ]
@@ -1,8 +1,13 @@
-from django.db import models
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.utils import timezone
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth.models import User
-from .push import ParseConnection, CLIENT_APP, FREELANCER_APP
+from .push import get_connection, CLIENT_APP, FREELANCER_APP
+from .signals import notifications_changed
 
 # class UserNotificationSettings(models.Model):
 #     """Settings for each user related to notifications.
@@ -17,6 +22,55 @@ class NotificationQuerySet(models.QuerySet):
         "Filters by notifications for the current user."
         return self.filter(user=user).filter(datetime_deleted=None)
 
+    def bulk_notify(self, users, message, category, related_object=None,
+                    immediately=False):
+        """Creates the same notification for each of the supplied users,
+        in a single insert, and queues a single task to send them all
+        as push notifications.  Tasks that shouldn't wait for the queue
+        can pass immediately=True to push them in the current thread instead,
+        unless they are inside a transaction.
+
+        As when creating the notifications individually, the push
+        notifications aren't sent if the transaction is rolled back.
+        """
+        users = list(users)
+        if not users:
+            return
+        if related_object:
+            content_type = ContentType.objects.get_for_model(related_object)
+            object_id = related_object.pk
+        else:
+            content_type, object_id = None, None
+
+        self.bulk_create([
+            self.model(user=user, message=message, category=category,
+                       content_type=content_type, object_id=object_id)
+            for user in users])
+        UnreadNotificationCount.objects.adjust([user.pk for user in users], 1)
+        notifications_changed.send(sender=self.model,
+                                   user_ids=[user.pk for user in users])
+
+        # Imported here to avoid a circular import
+        from . import outbox
+        from .tasks import (send_bulk_push_notification,
+                            deliver_bulk_push_notification)
+        args = ([user.pk for user in users], message, category,
+                content_type.model if content_type else None, object_id)
+        if outbox.is_active():
+            outbox.enqueue_push(*args)
+        elif immediately and not transaction.get_connection().in_atomic_block:
+            deliver_bulk_push_notification(*args)
+        else:
+            # bulk_create doesn't set the primary keys, so look up one of
+            # the notifications for the task to wait for, in the same way
+            # as send_push_notification waits for a single notification;
+            # they are all committed (or rolled back) together
+            notification_id = self.filter(user=users[0], message=message,
+                                category=category, content_type=content_type,
+                                object_id=object_id
+                            ).order_by('-pk').values_list('pk', flat=True)[0]
+            send_bulk_push_notification(*args, notification_id=notification_id)
+
 
 class Notification(models.Model):
     """A notification is a message sent by the system to a particular user.
@@ -42,24 +96,55 @@ class Notification(models.Model):
     def save(self, *args, **kwargs):
         created = not self.pk
         super(Notification, self).save(*args, **kwargs)
-        # If the Notification is being created, send as a push notification too
+        # If the Notification is being created, send as a push notification
+        # too, via the queue
         if created:
-            self.send_as_push()
+            if not self.datetime_deleted:
+                UnreadNotificationCount.objects.adjust([self.user_id], 1)
+            # Imported here to avoid a circular import
+            from . import outbox
+            from .tasks import send_push_notification
+            if outbox.is_active():
+                outbox.enqueue_push([self.user_id], self.message,
+                                    self.category, self.content_type.model,
+                                    self.object_id)
+            else:
+                send_push_notification(self.pk)
+
+    def delete(self, *args, **kwargs):
+        if self.pk and not self.datetime_deleted:
+            UnreadNotificationCount.objects.adjust([self.user_id], -1)
+        super(Notification, self).delete(*args, **kwargs)
 
-    def send_as_push(self):
-        """Sends the notification as an push notification."""
+    def mark_deleted(self):
+        """Marks the notification as deleted (i.e. read).  Notifications are
+        never really deleted, so there's a record of everything that was
+        sent out.
+        """
+        self.datetime_deleted = timezone.now()
+        # Update conditionally, so the unread count is only decremented once,
+        # even if the notification is deleted twice at the same time
+        if Notification.objects.filter(pk=self.pk, datetime_deleted=None
+                        ).update(datetime_deleted=self.datetime_deleted):
+            UnreadNotificationCount.objects.adjust([self.user_id], -1)
+            notifications_changed.send(sender=Notification,
+                                       user_ids=[self.user_id])
+
+    def send_as_push(self, fail_silently=True):
+        """Sends the notification as an push notification.
+        Normally this is done by the send_push_notification task.
+        """
 
         # Select the app to push to depending on the user
         app = FREELANCER_APP if self.user.is_freelancer else CLIENT_APP
 
-        # TODO - this should be sent to the queue instead,
-        # in case of network failure?
-        connection = ParseConnection(app)
+        connection = get_connection(app)
         connection.push_message(self.message,
                                 self.user,
                                 self.category,
                                 self.content_type.model,
-                                self.object_id)
+                                self.object_id,
+                                fail_silently=fail_silently)
 
     def __unicode__(self):
         return "%s..." % self.message[:15]
@@ -67,7 +152,187 @@ class Notification(models.Model):
     objects = NotificationQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-datetime_created',)
+        # The id breaks ties between notifications created at the same time,
+        # so the order is stable for the API's cursor pagination
+        ordering = ('-datetime_created', '-id')
+        index_together = (('user', 'datetime_deleted', 'datetime_created'),)
+
+
+class UnreadNotificationCountQuerySet(models.QuerySet):
+    "Custom queryset for UnreadNotificationCounts."
+
+    def get_for_user(self, user):
+        """Returns the number of unread notifications for the user.
+        If the user has no count yet, it is counted from their notifications.
+        """
+        try:
+            return self.get(user=user).unread_count
+        except UnreadNotificationCount.DoesNotExist:
+            return self.create_for_user(user.pk, 0)
+
+    def create_for_user(self, user_id, amount):
+        """Creates the user's count from their notifications, and returns it.
+        If another transaction creates it first, the amount is added to
+        that instead.
+
+        Notifications that are created but not yet committed when the count
+        is made adjust it themselves: their transaction either finds the
+        row, or tries to create it too.  The unique user makes the second
+        insert wait for the first to commit, and then fail, so each
+        notification is counted exactly once.
+        """
+        unread_count = Notification.objects.filter(
+            user_id=user_id, datetime_deleted=None).count()
+        try:
+            with transaction.atomic():
+                self.create(user_id=user_id, unread_count=unread_count)
+        except IntegrityError:
+            if amount:
+                self.filter(user_id=user_id).update(
+                        unread_count=models.F('unread_count') + amount)
+            return self.get(user_id=user_id).unread_count
+        return unread_count
+
+    def adjust(self, user_ids, amount):
+        """Adds the amount to the unread counts of the users with the
+        supplied ids.  Users without a count have it created, when the
+        amount is positive, so that notifications created while another
+        request is first counting them aren't missed.  (Counts that are
+        missing when notifications are read are left alone, as they will
+        be counted from scratch when they're first needed.)
+        """
+        user_ids = set(user_ids)
+        updated = self.filter(user_id__in=user_ids).update(
+                        unread_count=models.F('unread_count') + amount)
+        if updated == len(user_ids) or amount < 0:
+            return
+        existing = set(self.filter(user_id__in=user_ids)
+                           .values_list('user_id', flat=True))
+        for user_id in user_ids - existing:
+            self.create_for_user(user_id, amount)
+
+
+class UnreadNotificationCount(models.Model):
+    """The number of unread (i.e. not deleted) notifications for a user,
+    kept up to date as notifications are created and deleted, so the
+    mobile apps can poll for it cheaply.
+    """
+    user = models.OneToOneField(User, primary_key=True,
+                                related_name='unread_notification_count')
+    unread_count = models.IntegerField(default=0)
+
+    objects = UnreadNotificationCountQuerySet.as_manager()
+
+    def __unicode__(self):
+        return '%d unread notifications for %s' % (self.unread_count,
+                                                   self.user)
+
+class OutboxMessageQuerySet(models.QuerySet):
+    "Custom queryset for OutboxMessages."
+
+    def enqueue(self, channel, payloads):
+        """Adds messages to the outbox, one for each of the supplied
+        payloads, in a single insert.  Each payload should be a dictionary
+        that can be serialized as JSON; see apps.notification.outbox for
+        what each channel expects.
+        """
+        return self.bulk_create([
+            self.model(channel=channel, payload=json.dumps(payload))
+            for payload in payloads])
+
+    def pending(self):
+        "Filters by messages waiting to be delivered."
+        return self.filter(status=OutboxMessage.STATUS_PENDING)
+
+class OutboxMessage(models.Model):
+    """An email, SMS or push notification waiting to be delivered.
+
+    When NOTIFICATION_OUTBOX_ACTIVE is set, these are written in the same
+    transaction as whatever caused them, rather than being sent straight
+    away, and are then delivered by the deliver_outbox management command.
+    """
+    CHANNEL_EMAIL = 'EM'
+    CHANNEL_SMS = 'SM'
+    CHANNEL_PUSH = 'PU'
+    CHANNEL_CHOICES = (
+        (CHANNEL_EMAIL, 'Email'),
+        (CHANNEL_SMS, 'SMS'),
+        (CHANNEL_PUSH, 'Push notification'),
+    )
+    channel = models.CharField(max_length=2, choices=CHANNEL_CHOICES)
+    # JSON serialized details of the message
+    payload = models.TextField()
+
+    STATUS_PENDING = 'PE'
+    STATUS_IN_PROGRESS = 'IP'
+    STATUS_SENT = 'SE'
+    STATUS_FAILED = 'FA'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_IN_PROGRESS, 'In progress'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    )
+    status = models.CharField(max_length=2, choices=STATUS_CHOICES,
+                              default=STATUS_PENDING)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    datetime_created = models.DateTimeField(auto_now_add=True)
+    # When the message should next be attempted
+    datetime_available = models.DateTimeField(default=timezone.now)
+    datetime_sent = models.DateTimeField(null=True, blank=True)
+    # While in progress, when the worker's claim on the message runs out,
+    # after which another worker may claim it (e.g. if the first crashed)
+    datetime_claimed_until = models.DateTimeField(null=True, blank=True)
+
+    objects = OutboxMessageQuerySet.as_manager()
+
+    def get_payload(self):
+        return json.loads(self.payload)
+
+    def mark_sent(self):
+        "Records that the message was delivered, and saves it."
+        self.attempts += 1
+        self.status = self.STATUS_SENT
+        self.datetime_sent = timezone.now()
+        self.save_outcome()
+
+    def mark_failed(self, error, retry=True):
+        """Records a failed attempt at delivery, either scheduling another
+        attempt or, after NOTIFICATION_OUTBOX_MAX_ATTEMPTS (or if retry is
+        False), giving up; then saves it.
+        """
+        self.attempts += 1
+        self.last_error = unicode(error)
+        if not retry or \
+                self.attempts >= settings.NOTIFICATION_OUTBOX_MAX_ATTEMPTS:
+            self.status = self.STATUS_FAILED
+        else:
+            self.status = self.STATUS_PENDING
+            # Wait twice as long after each attempt
+            self.datetime_available = timezone.now() + timedelta(seconds=
+                    settings.NOTIFICATION_OUTBOX_RETRY_DELAY
+                                                * 2 ** (self.attempts - 1))
+        self.save_outcome()
+
+    def save_outcome(self):
+        """Saves the outcome of a delivery attempt straight away, so it
+        isn't lost if the worker stops before the rest of the batch is done.
+        """
+        self.datetime_claimed_until = None
+        self.save(update_fields=['status', 'attempts', 'last_error',
+                                 'datetime_available', 'datetime_sent',
+                                 'datetime_claimed_until'])
+
+    def __unicode__(self):
+        return '%s message %d' % (self.get_channel_display(), self.pk)
+
+    class Meta:
+        index_together = (('status', 'datetime_available'),)
+        ordering = ('datetime_created',)
+
 
 # def dispatch_notifications(user, category, context={},
 #                            related_object=None):
@@ -0,0 +1,265 @@
+"""The notification outbox.
+
+When NOTIFICATION_OUTBOX_ACTIVE is set, emails, SMS messages and push
+notifications aren't sent straight away.  Instead, they are written to the
+outbox (as OutboxMessages) in the same transaction as whatever caused them,
+so a slow provider doesn't hold up the request, and nothing is sent for
+changes that are rolled back.
+
+They are then delivered by one or more workers running:
+
+    python manage.py deliver_outbox
+
+Each worker claims batches of messages with SELECT ... FOR UPDATE SKIP LOCKED
+(so several can safely run at once), marking them as in progress until
+NOTIFICATION_OUTBOX_CLAIM_DURATION from now, in a short transaction.  It then
+delivers them outside the transaction, saving the outcome of each message as
+soon as it is known.  If a worker stops, its claims run out, and the messages
+it hadn't finished are claimed again by another worker.
+
+This needs PostgreSQL 9.5 or later, for SKIP LOCKED.
+"""
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection, transaction
+from django.utils import timezone
+from apps.core.executor import run_concurrently
+from apps.core.utils import OutcomeUnknown
+from .models import OutboxMessage
+from .push import (get_connection as get_push_connection, get_users_by_app,
+                   ParseConnection, PushBatchesFailed)
+from .sms import deliver_sms_messages
+import logging
+
+logger = logging.getLogger('project')
+
+
+def is_active():
+    "Returns whether notifications should be written to the outbox."
+    return getattr(settings, 'NOTIFICATION_OUTBOX_ACTIVE', False)
+
+
+def enqueue_push(user_ids, message, category, content_type_name, object_id):
+    """Adds a push notification to the outbox for the supplied users,
+    one message per app for each batch of users that Parse is sent at once,
+    so each batch is delivered (and retried) separately.
+    """
+    payloads = []
+    for app, users in get_users_by_app(user_ids):
+        emails = [user.email for user in users]
+        for start in range(0, len(emails), ParseConnection.BATCH_SIZE):
+            payloads.append({
+                'app': app,
+                'emails': emails[start:start + ParseConnection.BATCH_SIZE],
+                'message': message,
+                'category': category,
+                'content_type_name': content_type_name,
+                'object_id': object_id,
+            })
+    OutboxMessage.objects.enqueue(OutboxMessage.CHANNEL_PUSH, payloads)
+
+
+def enqueue_sms(messages):
+    """Adds SMS messages to the outbox.  messages should be a list of
+    (user id, phone number, message) tuples.
+    """
+    OutboxMessage.objects.enqueue(OutboxMessage.CHANNEL_SMS, [{
+            'user_id': user_id,
+            'phone_number': phone_number,
+            'message': message,
+        } for user_id, phone_number, message in messages])
+
+
+class OutboxEmailBackend(BaseEmailBackend):
+    """Email backend that writes the emails to the outbox.
+    apps.core.email uses this when the outbox is active.
+    """
+    def send_messages(self, email_messages):
+        OutboxMessage.objects.enqueue(OutboxMessage.CHANNEL_EMAIL,
+                                      [serialize_email(email_message)
+                                       for email_message in email_messages])
+        return len(email_messages)
+
+
+def serialize_email(email_message):
+    "Returns a dictionary representing the supplied EmailMultiAlternatives."
+    return {
+        'subject': email_message.subject,
+        'body': email_message.body,
+        'from_email': email_message.from_email,
+        'to': email_message.to,
+        'cc': email_message.cc,
+        'bcc': email_message.bcc,
+        'alternatives': getattr(email_message, 'alternatives', []),
+    }
+
+
+def deserialize_email(payload):
+    "Returns an EmailMultiAlternatives from the output of serialize_email."
+    return EmailMultiAlternatives(payload['subject'], payload['body'],
+                                  payload['from_email'], payload['to'],
+                                  cc=payload['cc'], bcc=payload['bcc'],
+                                  alternatives=[tuple(alternative) for
+                                        alternative in payload['alternatives']])
+
+
+def deliver_emails(outbox_messages):
+    """Delivers the email outbox messages, in up to
+    DELIVERY_CONCURRENCY['email'] threads, each over a single connection.
+    """
+    run_concurrently('email', outbox_messages, deliver_emails_over_connection)
+
+
+def deliver_emails_over_connection(outbox_messages):
+    "Delivers the email outbox messages over a single connection."
+    connection = get_connection()
+    connection.open()
+    try:
+        for outbox_message in outbox_messages:
+            try:
+                connection.send_messages([deserialize_email(
+                                            outbox_message.get_payload())])
+            except Exception as e:
+                outbox_message.mark_failed(e)
+            else:
+                outbox_message.mark_sent()
+    finally:
+        connection.close()
+
+
+def deliver_sms(outbox_messages):
+    "Delivers the SMS outbox messages."
+    payloads = [outbox_message.get_payload()
+                for outbox_message in outbox_messages]
+
+    def record_outcome(index, error):
+        if error:
+            # Messages that may have been sent aren't retried
+            outbox_messages[index].mark_failed(error,
+                            retry=not isinstance(error, OutcomeUnknown))
+        else:
+            outbox_messages[index].mark_sent()
+
+    deliver_sms_messages([(payload['user_id'], payload['phone_number'],
+                           payload['message']) for payload in payloads],
+                         record_outcome)
+
+
+def deliver_push(outbox_messages):
+    """Delivers the push notification outbox messages, in up to
+    DELIVERY_CONCURRENCY['push'] threads.
+    """
+    run_concurrently('push', outbox_messages, deliver_push_over_connection)
+
+
+def deliver_push_over_connection(outbox_messages):
+    """Delivers the push notification outbox messages, using this thread's
+    connection to each app (see push.get_connection).
+    """
+    for outbox_message in outbox_messages:
+        payload = outbox_message.get_payload()
+        try:
+            get_push_connection(payload['app']).push_message_to_emails(
+                        payload['message'], payload['emails'],
+                        payload['category'], payload['content_type_name'],
+                        payload['object_id'], fail_silently=False)
+        except PushBatchesFailed as e:
+            # Don't push again if Parse may have accepted it
+            outbox_message.mark_failed(e, retry=bool(e.emails))
+        except Exception as e:
+            outbox_message.mark_failed(e)
+        else:
+            outbox_message.mark_sent()
+
+
+# How to deliver each channel.  Each should mark each message as sent or
+# failed (which saves it) as soon as it knows.
+CHANNEL_DELIVERERS = {
+    OutboxMessage.CHANNEL_EMAIL: deliver_emails,
+    OutboxMessage.CHANNEL_SMS: deliver_sms,
+    OutboxMessage.CHANNEL_PUSH: deliver_push,
+}
+
+
+def claim_messages(batch_size):
+    """Claims up to batch_size messages that are ready to deliver, marking
+    them as in progress, and returns them.  Messages locked by other
+    workers are skipped; messages whose claims have run out are
+    claimed again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        outbox_messages = list(OutboxMessage.objects.raw("""
+            SELECT * FROM "%s"
+            WHERE ("status" = %%s AND "datetime_available" <= %%s)
+            OR ("status" = %%s AND "datetime_claimed_until" <= %%s)
+            ORDER BY "id"
+            LIMIT %%s
+            FOR UPDATE SKIP LOCKED
+        """ % OutboxMessage._meta.db_table, [
+                            OutboxMessage.STATUS_PENDING, now,
+                            OutboxMessage.STATUS_IN_PROGRESS, now,
+                            batch_size]))
+        claimed_until = now + timedelta(
+                        seconds=settings.NOTIFICATION_OUTBOX_CLAIM_DURATION)
+        OutboxMessage.objects.filter(pk__in=[outbox_message.pk
+                                for outbox_message in outbox_messages]
+                            ).update(status=OutboxMessage.STATUS_IN_PROGRESS,
+                                     datetime_claimed_until=claimed_until)
+    return outbox_messages
+
+
+def deliver_messages(outbox_messages):
+    """Delivers the supplied outbox messages, each channel in its own
+    thread, saving the outcome of each message.
+    """
+    messages_by_channel = {}
+    for outbox_message in outbox_messages:
+        messages_by_channel.setdefault(outbox_message.channel,
+                                       []).append(outbox_message)
+
+    threads = [threading.Thread(target=deliver_channel,
+                                args=(channel, channel_messages))
+               for channel, channel_messages in messages_by_channel.items()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def deliver_channel(channel, outbox_messages):
+    "Delivers the outbox messages for a single channel, in its own thread."
+    attempts = [outbox_message.attempts for outbox_message in outbox_messages]
+    try:
+        CHANNEL_DELIVERERS[channel](outbox_messages)
+    except Exception as e:
+        logger.exception(e)
+        # Record the failure on any messages the deliverer didn't get to
+        for outbox_message, previous_attempts in zip(outbox_messages,
+                                                     attempts):
+            if outbox_message.attempts == previous_attempts:
+                outbox_message.mark_failed(e)
+    finally:
+        # Each thread has its own database connection
+        connection.close()
+
+
+def deliver_batch(batch_size):
+    """Claims and delivers a batch of outbox messages.
+    Returns the number of messages in the batch.
+    """
+    outbox_messages = claim_messages(batch_size)
+    if outbox_messages:
+        deliver_messages(outbox_messages)
+    return len(outbox_messages)
+
+
+def database_supports_outbox():
+    """Returns whether the database supports SKIP LOCKED (PostgreSQL 9.5
+    or later), which claim_messages needs.
+    """
+    return connection.vendor == 'postgresql' and \
+                                        connection.pg_version >= 90500
@@ -1,6 +1,10 @@
-import json, httplib
+import json
+import threading
 import logging
 from django.conf import settings
+from django.contrib.auth.models import User
+from apps.freelancer.models import Freelancer
+from apps.core.utils import KeepAliveConnection, OutcomeUnknown
 
 
 logger = logging.getLogger('project')
@@ -8,6 +12,29 @@ logger = logging.getLogger('project')
 CLIENT_APP = 'CLIENT'
 FREELANCER_APP = 'FREELANCER'
 
+
+class PushError(Exception):
+    "Raised when Parse doesn't accept a push."
+    pass
+
+
+class PushBatchesFailed(PushError):
+    """Raised when some of the batches of a push failed.  The other batches
+    were still sent, so only the failed ones should be retried:
+
+    - emails are those in batches that Parse didn't accept, and can be
+      pushed to again;
+    - unknown_emails are those in batches whose outcome is unknown (see
+      OutcomeUnknown), which shouldn't be, in case they were pushed to.
+    """
+    def __init__(self, emails, unknown_emails, error):
+        super(PushBatchesFailed, self).__init__(
+            'Push failed for %d users (and may have failed for %d more): %s'
+                                % (len(emails), len(unknown_emails), error))
+        self.emails = emails
+        self.unknown_emails = unknown_emails
+
+
 class ParseConnection(object):
     """Object for handling push requests via Parse.
     
@@ -18,23 +45,28 @@ class ParseConnection(object):
     or:
     
         connection = ParseConnection(FREELANCER_APP)
-    
+
+    The underlying HTTPS connection is kept alive between pushes, so
+    it's best to reuse the connection via get_connection().
     """
     PARSE_URL = 'api.parse.com'
     PARSE_PORT = 443
     PARSE_PUSH_ENDPOINT = '/1/push'
+    PARSE_TIMEOUT = 10
 
+    # The maximum number of users to push to in a single request
+    BATCH_SIZE = 500
 
     def __init__(self, app):
         self.app = app
+        self.connection = KeepAliveConnection(self.PARSE_URL,
+                                              self.PARSE_PORT,
+                                              self.PARSE_TIMEOUT)
         try:
-            self.connection = httplib.HTTPSConnection(self.PARSE_URL,
-                                                      self.PARSE_PORT)
             self.connection.connect()
         except Exception as e:
             logger.exception(e)
 
-
     def get_app_id(self):
         "Returns the id for the app we're connecting to."
         return getattr(settings, 'PARSE_%s_APPLICATION_ID' % self.app)
@@ -45,32 +77,118 @@ class ParseConnection(object):
 
 
     def push_message(self, message, user, category,
-                     content_type_name, object_id):
-        data = {
-           "where": {
-             # The user email is used to identify the user
-             # TODO - this should really be the user id, in case they change
-             # their email address
-             "userEmail": user.email,
-           },
-           "data": {
-             "alert": message,
-             "category": category,
-             "content_type": content_type_name,
-             "object_id": object_id,
-           }
-        }
-        logger.debug('Attempting to send push notification to %s: %s' % (
-                                            self.get_app_id(), data))
-        try:
-            self.connection.request('POST', self.PARSE_PUSH_ENDPOINT,
-                                    json.dumps(data), {
+                     content_type_name, object_id, fail_silently=True):
+        """Pushes the message to the user's devices.
+        Unless fail_silently is True, any errors are raised.
+        """
+        self.push_message_to_users(message, [user], category,
+                                   content_type_name, object_id,
+                                   fail_silently)
+
+    def push_message_to_users(self, message, users, category,
+                              content_type_name, object_id,
+                              fail_silently=True):
+        """Pushes the same message to the devices of all the supplied users,
+        in batches of BATCH_SIZE users per request.
+        Unless fail_silently is True, any errors are raised.
+        """
+        # The user email is used to identify the user
+        # TODO - this should really be the user id, in case they change
+        # their email address
+        self.push_message_to_emails(message, [user.email for user in users],
+                                    category, content_type_name, object_id,
+                                    fail_silently)
+
+    def push_message_to_emails(self, message, emails, category,
+                               content_type_name, object_id,
+                               fail_silently=True):
+        """Pushes the same message to the devices of the users with the
+        supplied email addresses; see push_message_to_users.
+
+        A failed batch doesn't stop the others being sent.  Unless
+        fail_silently is True, PushBatchesFailed is then raised, with
+        the emails of the failed batches.
+        """
+        failed_emails, unknown_emails, last_error = [], [], None
+        for start in range(0, len(emails), self.BATCH_SIZE):
+            batch = emails[start:start + self.BATCH_SIZE]
+            data = {
+               "where": {
+                 "userEmail": {"$in": batch},
+               },
+               "data": {
+                 "alert": message,
+                 "category": category,
+                 "content_type": content_type_name,
+                 "object_id": object_id,
+               }
+            }
+            logger.debug('Attempting to send push notification to %s: %s' % (
+                                                self.get_app_id(), data))
+            try:
+                self.post(data)
+            except Exception as e:
+                logger.debug('Push failed.')
+                logger.exception(e)
+                if isinstance(e, OutcomeUnknown):
+                    unknown_emails.extend(batch)
+                else:
+                    failed_emails.extend(batch)
+                last_error = e
+            else:
+                logger.debug('Push sent.')
+
+        if last_error and not fail_silently:
+            raise PushBatchesFailed(failed_emails, unknown_emails, last_error)
+
+    def post(self, data):
+        """Posts the push data to Parse and reads the response,
+        raising PushError if Parse didn't accept it, or OutcomeUnknown if
+        it may or may not have (see KeepAliveConnection).
+        """
+        response_status, response_body = self.connection.post(
+                        self.PARSE_PUSH_ENDPOINT, json.dumps(data), {
                    "X-Parse-Application-Id": self.get_app_id(),
                    "X-Parse-REST-API-Key": self.get_app_key(),
-                   "Content-Type": "application/json"
+                   "Content-Type": "application/json",
                  })
-        except Exception as e:
-            logger.debug('Push failed.')
-            logger.exception(e)
-        else:
-            logger.debug('Push sent.')
+
+        if response_status >= 300:
+            logger.error('Parse rejected push for %s (status %d): %s' % (
+                                self.get_app_id(), response_status,
+                                response_body))
+            raise PushError('Parse responded with status %d: %s' % (
+                                            response_status, response_body))
+        return response_body
+
+
+# Connections are kept per thread, as httplib connections can't be shared
+_local = threading.local()
+
+
+def get_connection(app):
+    """Returns a kept-alive ParseConnection for the supplied app,
+    creating it if necessary.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    if app not in connections:
+        connections[app] = ParseConnection(app)
+    return connections[app]
+
+
+def get_users_by_app(user_ids):
+    """Returns a list of (app, users) tuples for the users with the supplied
+    ids, according to which app each user should be pushed to.  Works out
+    which users are freelancers in a single query.
+    """
+    users = list(User.objects.filter(pk__in=user_ids).only('email'))
+    freelancer_user_ids = set(Freelancer.objects.filter(
+                    user__in=user_ids).values_list('user_id', flat=True))
+    return [(app, app_users) for app, app_users in (
+                (FREELANCER_APP, [user for user in users
+                                  if user.pk in freelancer_user_ids]),
+                (CLIENT_APP, [user for user in users
+                              if user.pk not in freelancer_user_ids]))
+            if app_users]
@@ -0,0 +1,6 @@
+import django.dispatch
+
+
+# Signal that is sent when notifications are created or deleted in bulk,
+# or otherwise without the model signals being sent
+notifications_changed = django.dispatch.Signal(providing_args=['user_ids'])
@@ -1,6 +1,14 @@
-from twilio.rest import TwilioRestClient
+import base64
+import urllib
+import threading
+import time
 import logging
 from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from apps.core.executor import run_concurrently
+from apps.core.utils import KeepAliveConnection
 
 
 logger = logging.getLogger('project')
@@ -9,14 +17,26 @@ def get_international_phone_number(user):
     """Returns the phone number of the user in international format,
     or None if they have no phone number.
     """
-    if user.is_freelancer:
-        local_phone = user.freelancer.mobile
-    elif user.is_client:
-        local_phone = user.client.mobile
-    else:
-        return None
+    return get_international_phone_numbers([user]).get(user.pk)
 
-    return local_to_international_phone_number(local_phone)
+def get_international_phone_numbers(users):
+    """Returns a dictionary of the phone numbers of the supplied users,
+    in international format, keyed by user id.  Users without a phone number
+    are left out.
+
+    The numbers are looked up in a single query.
+    """
+    phone_numbers = {}
+    for user_id, freelancer_mobile, client_mobile in User.objects.filter(
+                                    pk__in=[user.pk for user in users]
+                        ).values_list('pk', 'freelancer__mobile',
+                                      'client__mobile'):
+        # As freelancers can also be clients, freelancer takes precedence
+        local_phone = freelancer_mobile or client_mobile
+        if local_phone:
+            phone_numbers[user_id] = local_to_international_phone_number(
+                                                                local_phone)
+    return phone_numbers
 
 def local_to_international_phone_number(local_phone):
     """Converts a local-style phone number (in the form 07xxx xxx xxx)
@@ -27,35 +47,217 @@ def local_to_international_phone_number(local_phone):
 
 def send_sms(user, message, related_object=None):
     """Send an SMS with the message, to the user.
-    
+
     Currently, this fails silently (though it logs the error).
-    
+
     Optionally, includes a link to a related object.
     """
-    logger.debug('Attempting to send sms: %s' % message)
+    send_sms_batch([(user, message, related_object)])
+
+
+def send_sms_batch(messages, immediately=False):
+    """Sends a batch of SMS messages.  Each message should be a tuple of
+    (user, message, related_object); related_object may be None.
 
-    phone_number = get_international_phone_number(user)
-    if not phone_number:
-        logger.debug('Could not get a phone number for user id %d.' % user.id)
+    The phone numbers are looked up together, and the messages are queued
+    to be sent by a single task (see send_sms_messages).  Tasks that
+    shouldn't wait for the queue can pass immediately=True to send them
+    in the current thread instead.
+    """
+    if not messages:
         return
+    phone_numbers = get_international_phone_numbers(
+                                        [user for user, m, o in messages])
+    outgoing = []
+    for user, message, related_object in messages:
+        logger.debug('Attempting to send sms: %s' % message)
+
+        phone_number = phone_numbers.get(user.pk)
+        if not phone_number:
+            logger.debug('Could not get a phone number for user id %d.' \
+                                                                    % user.id)
+            continue
+
+        if related_object:
+            message += ' See more: %s%s' % (settings.BASE_URL,
+                                            related_object.get_absolute_url())
+        # Add signature
+        message += ' The BuzzHire Team'
+
+        outgoing.append((user.id, phone_number, message))
+
+    if outgoing:
+        # Imported here to avoid a circular import
+        from . import outbox
+        if outbox.is_active():
+            outbox.enqueue_sms(outgoing)
+        elif immediately:
+            deliver_sms_messages(outgoing)
+        else:
+            from .tasks import send_sms_messages
+            send_sms_messages(outgoing)
+
+
+def deliver_sms_messages(messages, callback=None):
+    """Sends the supplied (user id, phone number, message) tuples using
+    the SMS_TRANSPORT, in up to DELIVERY_CONCURRENCY['sms'] threads, but
+    no faster than SMS_MESSAGES_PER_SECOND in total.
+
+    Currently, this fails silently for each message (though it logs
+    the error).  Returns a list of the exceptions raised for each message,
+    or None for the messages that were sent.  If a callback is supplied,
+    it is also called with the index and exception (or None) of each message
+    as soon as it is sent.
+    """
+    errors = [None] * len(messages)
+
+    def deliver(indexed_messages):
+        # Each thread has its own transport (see get_transport)
+        transport = get_transport()
+        for index, (user_id, phone_number, message) in indexed_messages:
+            # Keep to the provider's throughput
+            rate_limiter.wait(settings.SMS_MESSAGES_PER_SECOND)
+            try:
+                transport.send(phone_number, message)
+            except Exception as e:
+                logger.debug('Sending of SMS failed: user id %d, '
+                             'message "%s".' % (user_id, message))
+                logger.exception(e)
+                errors[index] = e
+            else:
+                logger.debug('SMS sent.')
+            if callback:
+                callback(index, errors[index])
+
+    run_concurrently('sms', enumerate(messages), deliver)
+    return errors
+
+
+class RateLimiter(object):
+    """Spaces out calls to wait(), across all threads, so they return
+    no more than the supplied number of times per second.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_slot = 0
+
+    def wait(self, per_second):
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + 1.0 / per_second
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class SharedRateLimiter(object):
+    """Like RateLimiter, but shared between all the processes using the
+    same redis (the huey consumers, the outbox workers, etc.), as a token
+    bucket holding up to a second's worth of calls.
+
+    If redis can't be reached, it falls back to limiting this process only.
+    """
+    # Takes a token from the bucket (refilling it for the time since it was
+    # last used), returning how many seconds to wait for it.  The bucket may
+    # go into debt, so each caller gets its own slot.
+    SCRIPT = """
+        local rate = tonumber(ARGV[1])
+        local now = tonumber(ARGV[2])
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'timestamp')
+        local tokens = tonumber(state[1]) or rate
+        local timestamp = tonumber(state[2]) or now
+        tokens = math.min(rate, tokens + math.max(now - timestamp, 0) * rate)
+        tokens = tokens - 1
+        redis.call('HMSET', KEYS[1], 'tokens', tokens, 'timestamp', now)
+        redis.call('EXPIRE', KEYS[1], 60)
+        if tokens >= 0 then
+            return '0'
+        end
+        return tostring(-tokens / rate)
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.script = None
+        self.local_rate_limiter = RateLimiter()
+
+    def wait(self, per_second):
+        try:
+            if self.script is None:
+                # Imported here, as it needs the cache to be configured
+                from django_redis import get_redis_connection
+                self.script = get_redis_connection('default').register_script(
+                                                                self.SCRIPT)
+                # Use the cache's key prefix, as installations share redis
+                self.key = cache.make_key('rate_limit:%s' % self.name)
+            delay = float(self.script(keys=[self.key],
+                                      args=[per_second, repr(time.time())]))
+        except Exception as e:
+            logger.exception(e)
+            self.local_rate_limiter.wait(per_second)
+            return
+        if delay > 0:
+            time.sleep(delay)
+
+rate_limiter = SharedRateLimiter('sms')
+
+
+# Transports are kept per thread, so their connections aren't shared
+_local = threading.local()
+
+def get_transport():
+    "Returns the SMS_TRANSPORT for the current thread."
+    if getattr(_local, 'transport_path', None) != settings.SMS_TRANSPORT:
+        _local.transport = import_string(settings.SMS_TRANSPORT)()
+        _local.transport_path = settings.SMS_TRANSPORT
+    return _local.transport
+
+
+class TwilioTransport(object):
+    """Sends SMS messages using the Twilio REST API, over a single
+    kept-alive HTTPS connection (see KeepAliveConnection).
+
+    (The Twilio client library opens a new connection for each message.)
+    """
+    TWILIO_URL = 'api.twilio.com'
+    TWILIO_PORT = 443
+    TWILIO_TIMEOUT = 10
+
+    def __init__(self):
+        self.connection = KeepAliveConnection(self.TWILIO_URL,
+                                              self.TWILIO_PORT,
+                                              self.TWILIO_TIMEOUT)
+
+    def get_endpoint(self):
+        return '/2010-04-01/Accounts/%s/Messages.json' % \
+                                                settings.TWILIO_ACCOUNT_SID
+
+    def send(self, phone_number, message):
+        """Sends the message, raising an exception if Twilio doesn't
+        accept it, or OutcomeUnknown if it may or may not have.
+        """
+        data = urllib.urlencode({
+            'To': phone_number,
+            'From': settings.TWILIO_PHONE_NUMBER,
+            'Body': message.encode('utf-8'),
+        })
+        status, body = self.connection.post(self.get_endpoint(), data, {
+            'Authorization': 'Basic %s' % base64.b64encode('%s:%s' % (
+                                                settings.TWILIO_ACCOUNT_SID,
+                                                settings.TWILIO_TOKEN)),
+            'Content-Type': 'application/x-www-form-urlencoded',
+        })
+        if status >= 300:
+            raise Exception('Twilio responded with status %d: %s' % (
+                                                                status, body))
+
+
+class LocalTransport(object):
+    """SMS transport that doesn't send anything, but keeps the messages in
+    LocalTransport.outbox, as (phone number, message) tuples.
+    For use in development and tests.
+    """
+    outbox = []
 
-    if related_object:
-        message += ' See more: %s%s' % (settings.BASE_URL,
-                                        related_object.get_absolute_url())
-    # Add signature
-    message += ' The BuzzHire Team'
-
-    try:
-        client = TwilioRestClient(settings.TWILIO_ACCOUNT_SID,
-                                  settings.TWILIO_TOKEN)
-        client.messages.create(
-            to=phone_number,
-            from_=settings.TWILIO_PHONE_NUMBER,
-            body=message,
-        )
-    except Exception as e:
-        logger.debug('Sending of SMS failed: user id %d, message "%s".' % (
-                                    user.id, message))
-        logger.exception(e)
-    else:
-        logger.debug('SMS sent.')
+    def send(self, phone_number, message):
+        self.outbox.append((phone_number, message))
@@ -0,0 +1,126 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from huey.djhuey import db_task
+from .models import Notification
+from .push import get_connection, get_users_by_app, PushBatchesFailed
+from .sms import deliver_sms_messages
+import logging
+
+logger = logging.getLogger('project')
+
+
+@db_task()
+def send_push_notification(notification_id, attempt=1):
+    """Huey task for sending a notification as a push notification.
+
+    If the push fails, or the notification can't be found (for example,
+    because the transaction that created it hasn't been committed yet),
+    the task is rescheduled, waiting twice as long each time, up to
+    PUSH_NOTIFICATION_MAX_ATTEMPTS attempts.  Pushes that may have been
+    accepted (see PushBatchesFailed) aren't retried.
+    """
+    try:
+        notification = Notification.objects.select_related(
+                        'user', 'content_type').get(pk=notification_id)
+        notification.send_as_push(fail_silently=False)
+    except Exception as e:
+        if isinstance(e, PushBatchesFailed) and not e.emails:
+            # Retrying could push to the user twice
+            return
+        if attempt >= settings.PUSH_NOTIFICATION_MAX_ATTEMPTS:
+            print('[%s] Gave up sending push notification %d after %d '
+                  'attempts.' % (time.ctime(), notification_id, attempt))
+            if not isinstance(e, Notification.DoesNotExist):
+                # Reraise exception so it gets caught by other logging
+                raise
+            return
+
+        logger.debug('Push notification %d failed (attempt %d): %s' % (
+                                            notification_id, attempt, e))
+        retry_later(send_push_notification, (notification_id,), attempt)
+
+
+@db_task()
+def send_bulk_push_notification(user_ids, message, category,
+                                content_type_name, object_id,
+                                notification_id=None, attempt=1):
+    """Huey task for pushing the same notification to many users,
+    as created by Notification.objects.bulk_notify().
+
+    notification_id should be the id of one of the notifications created.
+    Until it can be found (i.e. the transaction that created them has been
+    committed) the task is rescheduled, as in send_push_notification, and
+    nothing is pushed if it never is.
+    """
+    if notification_id is not None and \
+            not Notification.objects.filter(pk=notification_id).exists():
+        if attempt >= settings.PUSH_NOTIFICATION_MAX_ATTEMPTS:
+            print('[%s] Gave up sending push notification to %d users after '
+                  '%d attempts, as notification %d was never committed.' % (
+                        time.ctime(), len(user_ids), attempt, notification_id))
+            return
+        retry_later(send_bulk_push_notification, (user_ids, message,
+                        category, content_type_name, object_id,
+                        notification_id), attempt)
+        return
+
+    deliver_bulk_push_notification(user_ids, message, category,
+                                   content_type_name, object_id, attempt)
+
+
+def deliver_bulk_push_notification(user_ids, message, category,
+                                   content_type_name, object_id, attempt=1):
+    """Pushes the same notification to many users, in batches, for each
+    app.  The users in any batches that fail are retried by
+    send_bulk_push_notification, in the same way as send_push_notification;
+    those in batches that may have been accepted aren't.
+    """
+    failed_user_ids = []
+    for app, app_users in get_users_by_app(user_ids):
+        try:
+            get_connection(app).push_message_to_users(message, app_users,
+                                        category, content_type_name,
+                                        object_id, fail_silently=False)
+        except Exception as e:
+            if isinstance(e, PushBatchesFailed):
+                failed_emails = set(e.emails)
+                failed_users = [user for user in app_users
+                                if user.email in failed_emails]
+            else:
+                failed_users = app_users
+            if not failed_users:
+                continue
+            if attempt >= settings.PUSH_NOTIFICATION_MAX_ATTEMPTS:
+                print('[%s] Gave up sending push notification to %d users '
+                      'after %d attempts.' % (time.ctime(), len(failed_users),
+                                              attempt))
+                raise
+            logger.debug('Push notification to %d users failed '
+                         '(attempt %d): %s' % (len(failed_users), attempt, e))
+            failed_user_ids.extend(user.pk for user in failed_users)
+
+    if failed_user_ids:
+        retry_later(send_bulk_push_notification, (failed_user_ids, message,
+                            category, content_type_name, object_id, None),
+                    attempt)
+
+
+def retry_later(task, args, attempt):
+    """Schedules the push notification task to run again with the supplied
+    args, waiting twice as long after each attempt.
+    """
+    delay = settings.PUSH_NOTIFICATION_RETRY_DELAY * 2 ** (attempt - 1)
+    task.schedule(args=args + (attempt + 1,),
+                  eta=timezone.now() + timedelta(seconds=delay))
+
+
+@db_task()
+def send_sms_messages(messages):
+    """Huey task for sending a batch of SMS messages, as
+    (user id, phone number, message) tuples.  See sms.send_sms_batch().
+    """
+    deliver_sms_messages(messages)
+    print('[%s] Sent batch of %d SMS messages.' % (time.ctime(),
+                                                   len(messages)))
@@ -1,13 +1,15 @@
 import time
-from huey.djhuey import db_task
+from apps.core.queues import queue_db_task
 from . import utils
 
 
-@db_task()
+@queue_db_task('reminders')
 def send_reminders(reminder_set):
     """Huey task for sending out job request reminders.
     
     Accepts a ScheduledReminderSet. 
+
+    This runs on its own queue, so it isn't held up by other tasks.
     """
     print('[%s] send_reminders() called for %s.' % (time.ctime(),
                                     reminder_set.get_job_request_display()))
@@ -5,7 +5,7 @@ from django.utils import timezone
 from django.template.loader import render_to_string
 from apps.job.models import JobRequest
 from apps.notification.models import Notification
-from apps.notification.sms import send_sms
+from apps.notification.sms import send_sms_batch
 import logging
 
 logger = logging.getLogger('project')
@@ -101,7 +101,9 @@ class ScheduledReminderSet(object):
         return True
 
     def send_to_recipient(self, recipient, recipient_type):
-        "Sends reminders to a single recipient."
+        """Sends reminders to a single recipient, by email.
+        Notifications for the app and SMS messages are sent in send().
+        """
         content = render_to_string(
             'reminder/email/includes/jobrequest_reminder_%s.html' \
                                                         % recipient_type,
@@ -116,26 +118,39 @@ class ScheduledReminderSet(object):
                'bookings_email': settings.BOOKINGS_EMAIL},
               from_email=settings.BOOKINGS_FROM_EMAIL)
 
-        Notification.objects.create(
-                message=self.title,
-                category='%s_reminder' % recipient_type,
-                related_object=self.job_request,
-                user=recipient.user)
-
-        # Only send reminders to freelancers
-        if recipient_type == 'freelancer':
-            if self.sms_template_name:
-                send_sms(recipient.user, self.get_sms_message(),
-                         self.job_request)
 
 
     def send(self):
         """Sends out reminders to freelancers and client
         from the supplied reminder set.
+
+        As this is called from the reminders queue, the SMS messages and
+        push notifications are sent straight away, rather than being queued
+        behind other tasks.
         """
+        freelancers = [booking.freelancer for booking in
+            self.job_request.bookings.select_related('freelancer__user')]
+
         self.send_to_recipient(self.job_request.client, 'client')
-        for booking in self.job_request.bookings.all():
-            self.send_to_recipient(booking.freelancer, 'freelancer')
+        for freelancer in freelancers:
+            self.send_to_recipient(freelancer, 'freelancer')
+
+        # Only send SMS reminders to freelancers
+        if self.sms_template_name:
+            sms_message = self.get_sms_message()
+            send_sms_batch([(freelancer.user, sms_message, self.job_request)
+                            for freelancer in freelancers], immediately=True)
+
+        # Notifications for app, pushed together
+        for recipients, recipient_type in (
+                                    ([self.job_request.client], 'client'),
+                                    (freelancers, 'freelancer')):
+            Notification.objects.bulk_notify(
+                    [recipient.user for recipient in recipients],
+                    message=self.title,
+                    category='%s_reminder' % recipient_type,
+                    related_object=self.job_request,
+                    immediately=True)
 
     def get_sms_message(self):
         "Returns the text for the sms message."
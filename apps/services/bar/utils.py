@@ -5,6 +5,9 @@ class BarJobMatcher(JobMatcher):
     "JobMatcher tailored to matching bar staff."
 
     flat_fields = JobMatcher.flat_fields + ('role',)
+    matching_fields = JobMatcher.matching_fields + ('role',)
+    # The candidate index doesn't hold roles
+    candidate_index_class = None
 
     def get_results(self, *args, **kwargs):
         results = super(BarJobMatcher, self).get_results(*args, **kwargs)
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('driver', '0041_datamigration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='driver',
+            name='owned_vehicle_types_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='pizza_box_vehicle_types_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='standard_box_vehicle_types_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='vehicle_types_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+            preserve_default=True,
+        ),
+    ]
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+# Delivery box sizes and the masks for owned vehicles with at least that size
+DELIVERY_BOX_MASK_FIELDS = (
+    (2, 'standard_box_vehicle_types_mask'),
+    (4, 'pizza_box_vehicle_types_mask'),
+)
+# The highest vehicle type pk with a bit in the masks
+MAX_MASK_PK = 62
+
+
+def datamigration(apps, schema_editor):
+    """Populates the drivers' vehicle type masks from their vehicles.
+    NB this duplicates Driver.get_vehicle_masks(), as the historical model
+    doesn't have the method.
+    """
+    Driver = apps.get_model('driver', 'Driver')
+    DriverVehicleType = apps.get_model('driver', 'DriverVehicleType')
+    masks = {}
+    for vehicle in DriverVehicleType.objects.all():
+        driver_masks = masks.setdefault(vehicle.driver_id, {
+            'vehicle_types_mask': 0,
+            'owned_vehicle_types_mask': 0,
+            'standard_box_vehicle_types_mask': 0,
+            'pizza_box_vehicle_types_mask': 0,
+        })
+        if vehicle.vehicle_type_id > MAX_MASK_PK:
+            # Doesn't fit in the masks (see VehicleType.MAX_MASK_PK)
+            continue
+        bit = 1 << vehicle.vehicle_type_id
+        driver_masks['vehicle_types_mask'] |= bit
+        if vehicle.own_vehicle:
+            driver_masks['owned_vehicle_types_mask'] |= bit
+            for delivery_box, field_name in DELIVERY_BOX_MASK_FIELDS:
+                if vehicle.delivery_box >= delivery_box:
+                    driver_masks[field_name] |= bit
+    for driver_id, driver_masks in masks.items():
+        Driver.objects.filter(pk=driver_id).update(**driver_masks)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('driver', '0042_driver_vehicle_masks'),
+    ]
+
+    operations = [
+        migrations.RunPython(datamigration),
+    ]
@@ -4,6 +4,7 @@ from multiselectfield import MultiSelectField
 from apps.core.models import GeoPolymorphicManager
 from apps.freelancer.models import Freelancer, PublishedFreelancerManager
 from django.core.urlresolvers import reverse
+from apps.core import roles
 from apps.job.models import JobRequest, JobRequestQuerySet
 from apps.paygrade.models import BasePayGrade, BasePayGradeManager
 
@@ -15,7 +16,7 @@ def _is_driver(self):
     Returns whether or not the user account is a driver account,
     i.e. has a driver profile.
     ."""
-    return Driver.objects.filter(user=self).exists()
+    return roles.get_roles(self)['driver'] is not None
 User.is_driver = property(_is_driver)
 
 
@@ -24,10 +25,21 @@ def _driver(self):
     Returns the Freelancer for the user.  If it doesn't, raises
     Freelancer.DoesNotExist.
     """
-    return Driver.objects.get(user=self)
+    driver_id = roles.get_roles(self)['driver']
+    if driver_id is None:
+        raise Driver.DoesNotExist
+    return roles.get_profile(self, 'driver',
+                             lambda: Driver.objects.get(pk=driver_id))
 User.driver = property(_driver)
 
 
+@roles.register('driver')
+def get_driver_id(user):
+    "Returns the id of the user's driver profile, or None."
+    return Driver.objects.filter(user=user).values_list('pk',
+                                                        flat=True).first()
+
+
 class VehicleType(models.Model):
     """A type of vehicle that the driver may drive.
     """
@@ -44,9 +56,28 @@ class VehicleType(models.Model):
 
     objects = models.Manager()
 
+    # The highest pk that has a bit in the drivers' vehicle type masks,
+    # which are signed 64-bit integers
+    MAX_MASK_PK = 62
+
     def __unicode__(self):
         return self.title
 
+    def has_bit(self):
+        "Returns whether this vehicle type has a bit in the masks."
+        return 0 < self.pk <= self.MAX_MASK_PK
+
+    def get_bit(self):
+        """Returns the bit representing this vehicle type in the drivers'
+        vehicle type masks.  Raises ValueError if it doesn't have one
+        (see has_bit); vehicles of those types must be matched
+        against DriverVehicleType instead.
+        """
+        if not self.has_bit():
+            raise ValueError('Vehicle type %d has no bit in the vehicle '
+                             'type masks.' % self.pk)
+        return 1 << self.pk
+
     # TODO validation to prevent nested equivalence
     class Meta:
         ordering = ('title',)
@@ -168,12 +199,64 @@ class Driver(Freelancer):
     phone_type = models.CharField(max_length=2, choices=PHONE_TYPE_CHOICES,
                                   blank=True)
 
+    # Denormalized summary of the driver's vehicles, so job matching can
+    # filter on a single row per driver.  Each is a bitmask with a bit for
+    # each VehicleType (see VehicleType.get_bit), and is kept in sync
+    # by DriverVehicleType.
+    vehicle_types_mask = models.BigIntegerField(default=0, editable=False)
+    owned_vehicle_types_mask = models.BigIntegerField(default=0,
+                                                      editable=False)
+    # Owned vehicles with at least a standard / pizza delivery box
+    standard_box_vehicle_types_mask = models.BigIntegerField(default=0,
+                                                             editable=False)
+    pizza_box_vehicle_types_mask = models.BigIntegerField(default=0,
+                                                          editable=False)
+
+    DENORMALIZED_FIELDS = Freelancer.DENORMALIZED_FIELDS + (
+                    'vehicle_types_mask', 'owned_vehicle_types_mask',
+                    'standard_box_vehicle_types_mask',
+                    'pizza_box_vehicle_types_mask')
+
     objects = GeoPolymorphicManager()
     published_objects = PublishedFreelancerManager()
 
     def get_absolute_url(self):
         return reverse('freelancer_detail', args=(self.pk,))
 
+    def get_vehicle_masks(self):
+        """Returns the vehicle type masks for the driver, calculated from
+        their vehicles, as a dictionary keyed by field name.
+        """
+        masks = {
+            'vehicle_types_mask': 0,
+            'owned_vehicle_types_mask': 0,
+        }
+        for delivery_box, field_name in \
+                                DriverVehicleType.DELIVERY_BOX_MASK_FIELDS:
+            masks[field_name] = 0
+
+        for vehicle in self.drivervehicletype_set.select_related(
+                                                            'vehicle_type'):
+            if not vehicle.vehicle_type.has_bit():
+                continue
+            bit = vehicle.vehicle_type.get_bit()
+            masks['vehicle_types_mask'] |= bit
+            if vehicle.own_vehicle:
+                masks['owned_vehicle_types_mask'] |= bit
+                for delivery_box, field_name in \
+                                DriverVehicleType.DELIVERY_BOX_MASK_FIELDS:
+                    if vehicle.delivery_box >= delivery_box:
+                        masks[field_name] |= bit
+        return masks
+
+    def update_vehicle_masks(self):
+        "Recalculates the driver's vehicle type masks and saves them."
+        masks = self.get_vehicle_masks()
+        # Update without saving the rest of the instance
+        Driver.objects.filter(pk=self.pk).update(**masks)
+        for field_name, mask in masks.items():
+            setattr(self, field_name, mask)
+
     @classmethod
     def driver_from_freelancer(self, freelancer):
         "Returns the driver instance, given the freelancer instance."
@@ -217,11 +300,26 @@ class DriverVehicleType(models.Model):
                 help_text='What size delivery box does your vehicle have? '
                     '(Scooters, motorcycles and bicycles only.)')
 
+    # The Driver mask fields for owned vehicles with at least each
+    # size of delivery box, smallest first
+    DELIVERY_BOX_MASK_FIELDS = (
+        (DELIVERY_BOX_STANDARD, 'standard_box_vehicle_types_mask'),
+        (DELIVERY_BOX_PIZZA, 'pizza_box_vehicle_types_mask'),
+    )
+
     objects = DriverVehicleTypeQuerySet.as_manager()
 
     def __unicode__(self):
         return unicode(self.vehicle_type)
 
+    def save(self, *args, **kwargs):
+        super(DriverVehicleType, self).save(*args, **kwargs)
+        self.driver.update_vehicle_masks()
+
+    def delete(self, *args, **kwargs):
+        super(DriverVehicleType, self).delete(*args, **kwargs)
+        self.driver.update_vehicle_masks()
+
     class Meta:
         unique_together = ('driver', 'vehicle_type')
         ordering = ('vehicle_type__title',)
@@ -1,5 +1,108 @@
+import operator
 from apps.booking.utils import JobMatcher
-from apps.services.driver.models import DriverJobRequest, Driver
+from apps.booking.index import CandidateIndex
+from apps.services.driver.models import (DriverJobRequest, Driver,
+                                         DriverVehicleType)
+
+
+def get_vehicle_type_mask(vehicle_types):
+    """Returns the mask of the supplied vehicle types, or None if any of
+    them don't have a bit in the masks (see VehicleType.has_bit).
+    """
+    if not all(vehicle_type.has_bit() for vehicle_type in vehicle_types):
+        return None
+    return reduce(operator.or_, (vehicle_type.get_bit()
+                                 for vehicle_type in vehicle_types), 0)
+
+
+def get_matching_vehicles(vehicle_types, own_vehicle, minimum_delivery_box):
+    """Returns the DriverVehicleTypes that satisfy the vehicle requirements.
+    Used instead of the masks for vehicle types that don't have a bit.
+    """
+    vehicles = DriverVehicleType.objects.filter(vehicle_type__in=vehicle_types)
+    if own_vehicle:
+        vehicles = vehicles.filter(own_vehicle=True)
+        if minimum_delivery_box:
+            vehicles = vehicles.filter(
+                                    delivery_box__gte=minimum_delivery_box)
+    return vehicles
+
+
+def get_vehicle_mask_field(own_vehicle, minimum_delivery_box):
+    """Returns the name of the Driver vehicle type mask field that
+    satisfies the supplied vehicle requirements.
+    """
+    if not own_vehicle:
+        return 'vehicle_types_mask'
+    if minimum_delivery_box:
+        for delivery_box, field_name in \
+                                DriverVehicleType.DELIVERY_BOX_MASK_FIELDS:
+            if delivery_box >= int(minimum_delivery_box):
+                return field_name
+    return 'owned_vehicle_types_mask'
+
+
+class DriverCandidateIndex(CandidateIndex):
+    """CandidateIndex that also holds drivers' phone types and vehicle
+    type masks, so it can match on the driver job request fields."""
+
+    source_models = CandidateIndex.source_models + (DriverVehicleType,)
+
+    # The order of the vehicle type masks in each driver's row, after the
+    # phone type
+    MASK_COLUMNS = ('vehicle_types_mask', 'owned_vehicle_types_mask',
+                    'standard_box_vehicle_types_mask',
+                    'pizza_box_vehicle_types_mask')
+    NO_DRIVER = ('', 0, 0, 0, 0)
+
+    # Which phone types satisfy each phone requirement
+    PHONE_REQUIREMENT_MAP = {
+        DriverJobRequest.PHONE_REQUIREMENT_ANY:
+            lambda phone_type: phone_type not in (
+                                    Driver.PHONE_TYPE_NON_SMARTPHONE, ''),
+        DriverJobRequest.PHONE_REQUIREMENT_ANDROID:
+            lambda phone_type: phone_type == Driver.PHONE_TYPE_ANDROID,
+        DriverJobRequest.PHONE_REQUIREMENT_IPHONE:
+            lambda phone_type: phone_type == Driver.PHONE_TYPE_IPHONE,
+        DriverJobRequest.PHONE_REQUIREMENT_WINDOWS:
+            lambda phone_type: phone_type == Driver.PHONE_TYPE_WINDOWS,
+    }
+
+    def build(self):
+        super(DriverCandidateIndex, self).build()
+        # The phone type and vehicle type masks for each driver
+        self.drivers = dict((row[0], row[1:]) for row in
+                Driver.published_objects.values_list('pk', 'phone_type',
+                    'vehicle_types_mask', 'owned_vehicle_types_mask',
+                    'standard_box_vehicle_types_mask',
+                    'pizza_box_vehicle_types_mask'))
+
+    def filter_indexes(self, indexes, search_terms):
+        if search_terms['vehicle_type']:
+            vehicle_types = list(search_terms['vehicle_type'].as_queryset())
+            vehicle_type_mask = get_vehicle_type_mask(vehicle_types)
+            if vehicle_type_mask is None:
+                driver_ids = set(get_matching_vehicles(vehicle_types,
+                                    search_terms['own_vehicle'],
+                                    search_terms['minimum_delivery_box']
+                                ).values_list('driver_id', flat=True))
+                indexes = [i for i in indexes if self.pks[i] in driver_ids]
+            else:
+                mask_field = get_vehicle_mask_field(
+                                        search_terms['own_vehicle'],
+                                        search_terms['minimum_delivery_box'])
+                column = self.MASK_COLUMNS.index(mask_field) + 1
+                indexes = [i for i in indexes
+                    if self.drivers.get(self.pks[i], self.NO_DRIVER)[column]
+                                                        & vehicle_type_mask]
+
+        phone_requirement_test = self.PHONE_REQUIREMENT_MAP.get(
+                                            search_terms['phone_requirement'])
+        if phone_requirement_test:
+            indexes = [i for i in indexes if phone_requirement_test(
+                        self.drivers.get(self.pks[i], self.NO_DRIVER)[0])]
+
+        return indexes
 
 
 class DriverJobMatcher(JobMatcher):
@@ -8,6 +111,13 @@ class DriverJobMatcher(JobMatcher):
     flat_fields = JobMatcher.flat_fields + ('minimum_delivery_box',
                                             'own_vehicle', 'vehicle_type',
                                             'phone_requirement')
+    matching_fields = JobMatcher.matching_fields + ('minimum_delivery_box',
+                                            'own_vehicle', 'vehicle_type',
+                                            'phone_requirement')
+    candidate_index_class = DriverCandidateIndex
+
+    # The vehicle filter no longer joins to the drivers' vehicles
+    distinct_results = False
 
     def get_results(self, *args, **kwargs):
         results = super(DriverJobMatcher, self).get_results(*args, **kwargs)
@@ -37,29 +147,29 @@ class DriverJobMatcher(JobMatcher):
 
 
     def filter_by_vehicle_requirements(self, results):
-        "Filters by vehicle requirements."
+        """Filters by vehicle requirements, using the vehicle type masks
+        summarised on each driver, if the vehicle types have bits in them."""
 
         if self.search_terms['vehicle_type']:
             # The supplied vehicle type is a FlexibleVehicleType; unpack it
             # into individual VehicleTypes.
-            vehicle_types = self.search_terms['vehicle_type'].as_queryset()
-            if self.search_terms['own_vehicle']:
-                # Filter by vehicle types that are owned
-                filter_kwargs = {
-                    'drivervehicletype__vehicle_type': \
-                                    vehicle_types,
-                    'drivervehicletype__own_vehicle': True
-                }
-                # Include delivery box filter, if specified
-                if self.search_terms['minimum_delivery_box']:
-                    filter_kwargs['drivervehicletype__delivery_box__gte'] = \
-                                    self.search_terms['minimum_delivery_box']
-                results = results.filter(**filter_kwargs)
-            else:
-                # Just filter by vehicle types
-                filter_kwargs = {
-                    'vehicle_types': vehicle_types
-                }
-            return results.filter(**filter_kwargs)
+            vehicle_types = list(
+                            self.search_terms['vehicle_type'].as_queryset())
+            vehicle_type_mask = get_vehicle_type_mask(vehicle_types)
+            if vehicle_type_mask is None:
+                # Match against the vehicles themselves, as a subquery so
+                # the results don't need to be distinct
+                return results.filter(pk__in=get_matching_vehicles(
+                                vehicle_types,
+                                self.search_terms['own_vehicle'],
+                                self.search_terms['minimum_delivery_box']
+                            ).values('driver_id'))
 
-        return results
\ No newline at end of file
+            mask_field = get_vehicle_mask_field(
+                                    self.search_terms['own_vehicle'],
+                                    self.search_terms['minimum_delivery_box'])
+            return results.extra(where=['"%s"."%s" & %%s != 0' % (
+                                        Driver._meta.db_table, mask_field)],
+                                 params=[vehicle_type_mask])
+
+        return results
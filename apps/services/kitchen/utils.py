@@ -5,6 +5,9 @@ class KitchenJobMatcher(JobMatcher):
     "JobMatcher tailored to matching kitchen staff."
 
     flat_fields = JobMatcher.flat_fields + ('role',)
+    matching_fields = JobMatcher.matching_fields + ('role',)
+    # The candidate index doesn't hold roles
+    candidate_index_class = None
 
     def get_results(self, *args, **kwargs):
         results = super(KitchenJobMatcher, self).get_results(*args, **kwargs)
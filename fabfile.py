@@ -21,6 +21,7 @@ def live():
     env.nginx_process = 'live_nginx'
     env.uwsgi_process = 'live_uwsgi'
     env.huey_process = 'live_huey'
+    env.huey_reminders_process = 'live_huey_reminders'
     env.backup_on_deploy = True
     env.django_configuration = 'Live'
 
@@ -38,6 +39,7 @@ def stage():
     env.nginx_process = 'stage_nginx'
     env.uwsgi_process = 'stage_uwsgi'
     env.huey_process = 'stage_huey'
+    env.huey_reminders_process = 'stage_huey_reminders'
     env.backup_on_deploy = False
     env.django_configuration = 'Stage'
 
@@ -56,6 +58,7 @@ def dev():
     env.nginx_process = 'dev_nginx'
     env.uwsgi_process = 'dev_uwsgi'
     env.huey_process = 'dev_huey'
+    env.huey_reminders_process = 'dev_huey_reminders'
     env.backup_on_deploy = False
     env.django_configuration = 'Dev'
 
@@ -88,9 +91,10 @@ def reload_nginx():
 @task
 def restart_huey():
     """
-    Restart the huey process.
+    Restart the huey processes.
     """
     run('supervisorctl restart %s' % env.huey_process)
+    run('supervisorctl restart %s' % env.huey_reminders_process)
 
 @task
 def deploy(skip_backup=False):
@@ -12,11 +12,21 @@ class BraintreeSandboxMixin(object):
     BRAINTREE_SANDBOX = True
 
 class HueyMixin(object):
-    """Settings for the Huey task queue.
+    """Settings for the Huey task queue, and the cache (which uses the same
+    redis process).
     Should specify a HUEY_NAME that is unique for the redis process.
     """
     HUEY_NAME = ''
     HUEY_PORT = 6379
+    # The number of worker threads for the default queue (run_huey).
+    # Most tasks wait on the database or the network, so threads suffice.
+    HUEY_WORKERS = 4
+    # Additional queues, each with its own consumer (run_huey_queue),
+    # so reminders aren't held up by large invitation runs.
+    # See apps.core.queues.
+    HUEY_QUEUES = {
+        'reminders': {'workers': 2},
+    }
 
     def HUEY(self):
         return {
@@ -24,9 +34,24 @@ class HueyMixin(object):
             'name': self.HUEY_NAME,
             'connection': {'host': 'localhost', 'port': self.HUEY_PORT},
             'always_eager': False,
-            'consumer_options': {'workers': 1},
+            'consumer_options': {'workers': self.HUEY_WORKERS},
         }
 
+    def CACHES(self):
+        # Share the redis process with Huey, but in a separate database
+        return {
+            'default': {
+                'BACKEND': 'django_redis.cache.RedisCache',
+                'LOCATION': 'redis://127.0.0.1:%d/1' % self.HUEY_PORT,
+                'KEY_PREFIX': self.HUEY_NAME,
+            }
+        }
+
+    # Treat the cache as empty if redis is unavailable, rather than raising;
+    # roles and badge counts are read from it on most requests, so should
+    # fall back to the database (see apps.core.roles and apps.core.badges)
+    DJANGO_REDIS_IGNORE_EXCEPTIONS = True
+
     @property
     def LOGGING(self):
         # Make sure we mail admins during uncaught exceptions during Huey tasks;
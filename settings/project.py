@@ -73,6 +73,7 @@ class ProjectConfiguration(StandardConfiguration):
     )
 
     MIDDLEWARE_CLASSES = StandardConfiguration.MIDDLEWARE_CLASSES + (
+       'apps.core.middleware.RoleMiddleware',
        'apps.feedback.middleware.FeedbackMiddleware',
        'apps.core.middleware.StrictAuthenticationMiddleware',
     )
@@ -151,6 +152,10 @@ class ProjectConfiguration(StandardConfiguration):
 
     PARSE_CLIENT_APPLICATION_ID = '87WebYikYitgl6GOnavbGesoGvA6lka2oLVnH5i3'
     PARSE_FREELANCER_APPLICATION_ID = 'ARd59ixk04dHhZcY9aMYrBGHJGe9kLI7tdSYpdDV'
+    # Push notifications are sent by a task, which retries failures after
+    # PUSH_NOTIFICATION_RETRY_DELAY seconds, doubling each time
+    PUSH_NOTIFICATION_MAX_ATTEMPTS = 5
+    PUSH_NOTIFICATION_RETRY_DELAY = 30
 
     CONTACT_PHONE = '020 3322 3738'
     BOOKINGS_EMAIL = 'support@buzzhire.co'
@@ -161,9 +166,65 @@ class ProjectConfiguration(StandardConfiguration):
     # See apps.paygrade.templatetags.min_pay_ajax_endpoint()
     PAY_GRADE_REVERSE_URL = '%(service)s_pay_grade_for_client-detail'
 
+    # Whether to match freelancers for invitations using an in-process index,
+    # rather than querying the database each time (see apps.booking.index)
+    JOB_MATCHING_INDEX_ACTIVE = False
+    # The maximum number of seconds before the index is rebuilt, so that
+    # changes made in other processes get picked up
+    JOB_MATCHING_INDEX_MAX_AGE = 300
+
+    # The maximum number of freelancers to invite to a job request, best
+    # ranked first (see JobMatcher.rank_results), or None to invite all
+    # those that match
+    JOB_MATCHING_INVITATION_LIMIT = None
+    # If set, freelancers are invited in waves of this many, best ranked
+    # first.  Each subsequent wave is only invited if the job request is
+    # still short of applications after JOB_MATCHING_WAVE_INTERVAL minutes.
+    JOB_MATCHING_WAVE_SIZE = None
+    JOB_MATCHING_WAVE_INTERVAL = 15
+
     # The number of minutes before the booking a freelancer should arrive
     ARRIVAL_PERIOD_MINUTES = 15
 
+    # Whether to write emails, SMS messages and push notifications to the
+    # outbox, to be sent by the deliver_outbox management command, rather
+    # than sending them straight away (see apps.notification.outbox).
+    NOTIFICATION_OUTBOX_ACTIVE = False
+    # Failed outbox messages are retried after NOTIFICATION_OUTBOX_RETRY_DELAY
+    # seconds, doubling each time
+    NOTIFICATION_OUTBOX_MAX_ATTEMPTS = 5
+    NOTIFICATION_OUTBOX_RETRY_DELAY = 30
+    # How many seconds a worker has to deliver the messages it claims,
+    # before other workers may claim them (e.g. if it crashed)
+    NOTIFICATION_OUTBOX_CLAIM_DURATION = 600
+
+    # The most threads to deliver each channel with, when sending batches
+    # (see apps.core.executor).  Each thread keeps its own connection.
+    DELIVERY_CONCURRENCY = {
+        'email': 4,
+        'sms': 2,
+        'push': 8,
+    }
+
+    # How long to cache each user's badge counts (such as the number of jobs
+    # awaiting feedback) for, in seconds; they are also cleared when they
+    # change (see apps.core.badges)
+    BADGE_COUNT_CACHE_TIMEOUT = 300
+
+    # How long to cache which roles each user has (freelancer, client, etc.)
+    # for, in seconds; they are also cleared when they change
+    # (see apps.core.roles)
+    ROLE_CACHE_TIMEOUT = 3600
+
+    # How SMS messages are sent; use apps.notification.sms.LocalTransport
+    # to keep them in memory instead
+    SMS_TRANSPORT = 'apps.notification.sms.TwilioTransport'
+    # The most SMS messages to send per second, across all processes (see
+    # apps.notification.sms.SharedRateLimiter).  Twilio queues messages
+    # beyond what the phone number can send, so this is the rate the account
+    # accepts API requests at, rather than the number's sending rate.
+    SMS_MESSAGES_PER_SECOND = 10
+
     # These are numbers for the test Twilio account
     TWILIO_ACCOUNT_SID = 'AC28ae162c411ca4ac235efcdb0206c672'
     TWILIO_PHONE_NUMBER = '+15005550006'